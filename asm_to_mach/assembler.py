@@ -32,24 +32,84 @@ sizes.  Assembly code may use hexadecimal representations of data.  This is a
 compact bit representation composed of digits and the first six letters where
 each represents a different nibble.  All named size constants are specified in
 bytes.
+
+Assembly code can also be converted into relocatable object code.  Object code
+contains machine code with the label fields left as zeroes, a symbol table of
+the labels it sets and a relocation table of the label fields.  The linker
+places object code one after another and fills in the label fields.  This
+allows unchanging code to be assembled once and reused.
 """
 
+import struct
+import json
+
 CMDS      = ["add", "sub", "mul", "div", "and", "or", "zjump", "gjump", "copy",
                                                         "load", "store", "stop"]
-NIBB_SIZE = 0.5
+OPCODES   = {e : i for i, e in enumerate(CMDS)}
 WORD_SIZE = 4
 HEX       = 16
+NIBB_BITS = 4
+WORD_BITS = 32
+N_REGS    = 16
+REGS      = {f"r{i}" : i for i in range(N_REGS)}
+CHUNK_LEN = 2 ** 14
+WORD      = struct.Struct(">I")
+OBJ_MAGIC = b"PLOB"
+OBJ_HEAD  = struct.Struct(">4sII")
 
-def bits(datum, size):
+def number(datum, n_bits):
         """
-        Converts data to bit representations.
+        Converts data to numbers.
 
         Hexadecimal representations in assembly code are denoted with "0x".
+        Numbers must fit in the given numbers of bits.
+        """
+
+        datum  = str(datum)
+        result = int(datum, HEX if datum.startswith("0x") else 10)
+        if not 0 <= result < 2 ** n_bits:
+                raise OverflowError(f"{datum} does not fit in {n_bits} bits")
+
+        return result
+
+def register(reg):
+        """
+        Converts registers to numbers.
+
+        Registers are denoted with "r" followed by their numbers.
         """
 
-        base = HEX if str(datum).startswith("0x") else 10
+        result = REGS.get(reg)
+        if result is None:
+                result = number(reg[1:], NIBB_BITS)
+
+        return result
+
+def word(line, labels):
+        """
+        Converts one line of assembly code into a machine code word.
+
+        Command numbers are looked up in a dictionary.  Fields are packed into
+        integers with shifts.
+        """
+
+        line = line.split()[1:] if ":" in line else line.split()
+        cmd  = OPCODES.get(line[0])
+        if   cmd is None:
+                datum  = labels[line[0]] if line[0] in labels else line[0]
+                result = number(datum, WORD_BITS)
+        elif cmd == OPCODES["copy"]:
+                datum  = labels[line[1]] if line[1] in labels else line[1]
+                datum  = number(datum, WORD_BITS - 2 * NIBB_BITS)
+                result = cmd << (WORD_BITS - NIBB_BITS) | datum << NIBB_BITS | \
+                         register(line[2])
+        else:
+                result = cmd << (WORD_BITS - NIBB_BITS)
+                for i, e in enumerate(line[1:], 2):
+                        shift   = WORD_BITS - i * NIBB_BITS
+                        result |= register(e) << shift
 
-        return bin(int(str(datum), base))[2:].zfill(int(8 * size))
+        return result
 
 def machine_code(line, labels):
         """
@@ -58,37 +118,201 @@ def machine_code(line, labels):
         The machine code output has 32 bits.
         """
 
-        line = line.split()[1:] if ":" in line else line.split()
-        if line[0] in CMDS:
-                cmd = bits(CMDS.index(line[0]), NIBB_SIZE)
-                if line[0] == "copy":
-                        datum = line[1]
-                        datum = labels[datum] if datum in labels else datum
-                        datum = bits(datum,       WORD_SIZE - 2 * NIBB_SIZE)
-                        reg   = bits(line[2][1:], NIBB_SIZE)
-                        line  = cmd + datum + reg
-                else:
-                        regs  = [bits(r[1:], NIBB_SIZE) for r in line[1:]]
-                        pad   = (8 * WORD_SIZE - 4 - 4 * len(regs)) * "0"
-                        line  = cmd + "".join(regs) + pad
-        else:
-                datum = labels[line[0]] if line[0] in labels else line[0]
-                datum = bits(datum, WORD_SIZE)
-                line  = datum
+        return WORD.pack(word(line, labels))
+
+def instructions(lines):
+        """
+        Finds the instruction and data lines of assembly code.
+
+        Lines are stripped while blank and comment lines are skipped.
+        """
+
+        for e in lines:
+                e = e.strip()
+                if e and not e.startswith("#"):
+                        yield e
+
+def label_addresses(lines):
+        """
+        Finds the addresses of line labels.
+
+        When labels are repeated the last addresses are used.
+        """
+
+        result = {}
+        for i, e in enumerate(instructions(lines)):
+                if ":" in e:
+                        result[e[:e.find(":")]] = WORD_SIZE * i
 
-        return int(line, 2).to_bytes(WORD_SIZE, "big")
+        return result
 
-def assembler(asm_code):
+def assembler(asm_code, labels = None):
         """
         Converts assembly code into machine code.
 
         Conversions happen one assembly code line at a time.  Line labels are
-        replaced with numbers while blank and comment lines are ignored.
+        replaced with numbers while blank and comment lines are ignored.  The
+        machine code words are packed into a preallocated bytearray.  Repeated
+        lines are only converted once.  Label numbers can be given to override
+        the line label addresses.
+        """
+
+        lines  = list(instructions(asm_code.split("\n")))
+        labels = label_addresses(lines) | (labels or {})
+        words  = {}
+        result = bytearray(WORD_SIZE * len(lines))
+        for i, e in enumerate(lines):
+                e = e[e.find(":") + 1:].strip() if ":" in e else e
+                if e not in words:
+                        words[e] = word(e, labels)
+                WORD.pack_into(result, WORD_SIZE * i, words[e])
+
+        return bytes(result)
+
+def stream(asm_file, output, chunk_len = CHUNK_LEN):
+        """
+        Converts assembly code files into machine code in two passes.
+
+        The first pass only finds the line label addresses.  The second pass
+        converts the lines and writes the machine code in chunks of chunk_len
+        words.  Memory use is proportional to the number of labels rather than
+        the file sizes.  Assembly code files must be seekable.  Gives the same
+        results as the assembler.
+        """
+
+        labels = label_addresses(asm_file)
+        asm_file.seek(0)
+        chunk  = bytearray(WORD_SIZE * chunk_len)
+        words  = {}
+        i      = 0
+        for e in instructions(asm_file):
+                e = e[e.find(":") + 1:].strip() if ":" in e else e
+                if e not in words:
+                        words[e] = word(e, labels)
+                WORD.pack_into(chunk, WORD_SIZE * i, words[e])
+                i += 1
+                if i == chunk_len:
+                        output.write(chunk)
+                        words.clear()
+                        i = 0
+        output.write(chunk[:WORD_SIZE * i])
+
+def listing(asm_code, machine_code):
+        """
+        Creates listings.
+
+        Every machine code word is listed with its address, the nearest label
+        at or before it, and the line number and text of its assembly code
+        line.
+        """
+
+        lines  = [(i, e.strip()) for i, e in enumerate(asm_code.split("\n"), 1)]
+        lines  = [e for e in lines if e[1] and not e[1].startswith("#")]
+        label  = ""
+        result = ""
+        for address, (line_no, line) in zip(range(0, len(machine_code),
+                                                  WORD_SIZE), lines):
+                word    = machine_code[address:address + WORD_SIZE].hex()
+                label   = line[:line.find(":")] if ":" in line else label
+                result += f"{address:#010x}: 0x{word}  {label:<16}" \
+                          f"{line_no:>8}  {line}\n"
+
+        return result
+
+def is_label(datum, labels):
+        """
+        Helper function for object code.
+
+        Data are labels if they are line labels or if they are not numbers.
+        Numbers that are too large are left to the assembler.
+        """
+
+        try:
+                number(datum, WORD_BITS)
+                result = datum in labels
+        except ValueError:
+                result = True
+        except OverflowError:
+                result = datum in labels
+
+        return result
+
+def object_code(asm_code):
+        """
+        Converts assembly code into object code.
+
+        Object code begins with a magic number, the machine code length and
+        the tables length.  The machine code and the tables in JSON follow.
+        Symbols map labels to offsets.  Relocations list the offsets, labels
+        and kinds of the label fields.  Kinds are "copy" for copy data and
+        "word" for data lines.  Every label field is relocated including labels
+        set in the object code.
+        """
+
+        lines   = list(instructions(asm_code.split("\n")))
+        symbols = label_addresses(lines)
+        relocs  = []
+        for i, e in enumerate(lines):
+                e = e.split()[1:] if ":" in e else e.split()
+                if   e[0] == "copy" and is_label(e[1], symbols):
+                        relocs.append([WORD_SIZE * i, e[1], "copy"])
+                elif e[0] not in OPCODES and is_label(e[0], symbols):
+                        relocs.append([WORD_SIZE * i, e[0], "word"])
+        code    = assembler("\n".join(lines),
+                            {e[1] : 0 for e in relocs})
+        tables  = json.dumps({"symbols" : symbols, "relocs" : relocs},
+                             separators = (",", ":")).encode()
+        result  = OBJ_HEAD.pack(OBJ_MAGIC, len(code), len(tables))
+        result += code + tables
+
+        return result
+
+def read_object(obj):
+        """
+        Reads object code.
+
+        Returns the machine code, symbols and relocations.
+        """
+
+        magic, code_len, tables_len = OBJ_HEAD.unpack_from(obj)
+        if magic != OBJ_MAGIC:
+                raise ValueError("not object code")
+        code   = obj[OBJ_HEAD.size:OBJ_HEAD.size + code_len]
+        tables = obj[OBJ_HEAD.size + code_len:]
+        tables = json.loads(tables[:tables_len])
+
+        return code, tables["symbols"], tables["relocs"]
+
+def linker(objs):
+        """
+        Converts object code into machine code.
+
+        Object code is placed in the given order beginning at address zero.
+        Labels set in more than one object or never set raise ValueErrors.
         """
 
-        lines  = [e.strip() for e in asm_code.split("\n")]
-        lines  = [e for e in lines if e and not e.startswith("#")]
-        labels = {e : WORD_SIZE * i for i, e in enumerate(lines)}
-        labels = {e[:e.find(":")] : labels[e] for e in labels if ":" in e}
+        objs    = [read_object(e) for e in objs]
+        bases   = [0]
+        symbols = {}
+        for code, symbols_, relocs in objs:
+                for e in symbols_:
+                        if e in symbols:
+                                raise ValueError(f"label {e} set twice")
+                        symbols[e] = bases[-1] + symbols_[e]
+                bases.append(bases[-1] + len(code))
+        result  = bytearray(b"".join(e[0] for e in objs))
+        for base, (code, symbols_, relocs) in zip(bases, objs):
+                for offset, label, kind in relocs:
+                        if label not in symbols:
+                                raise ValueError(f"label {label} not set")
+                        if kind == "word":
+                                word_ = number(symbols[label], WORD_BITS)
+                        else:
+                                datum = number(symbols[label],
+                                               WORD_BITS - 2 * NIBB_BITS)
+                                word_ = WORD.unpack_from(result,
+                                                         base + offset)[0]
+                                word_ = word_ | datum << NIBB_BITS
+                        WORD.pack_into(result, base + offset, word_)
 
-        return b"".join([machine_code(e, labels) for e in lines])
+        return bytes(result)
@@ -0,0 +1,307 @@
+"""
+Copyright 2025 Christian Seberino
+
+This file is part of Pylayers.
+
+Pylayers is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+Pylayers is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+Pylayers. If not, see <https://www.gnu.org/licenses/>.
+
+________________________________________________________________________________
+
+
+Contains the optimizer.
+
+Removes and replaces assembly code instructions so that fewer instructions are
+executed.  Lines are scanned from beginning to end while the register values
+set by copies, loads and arithmetic on known values are remembered.  Labels and
+data lines may be reached from anywhere so everything is forgotten at them.
+Stores may change any memory word so remembered loads are forgotten at them.
+Copies of values registers already have are removed.  Loads of memory words
+registers already have are removed or replaced with or instructions that copy
+registers.  Jumps with known conditions are removed or become unconditional.
+Jumps to jumps that are certain to jump go directly to the final destinations.
+Jumps to stops are not replaced with stops since that changes the instruction
+pointer register values at the stops.
+Instructions after stops and unconditional jumps that are not labeled are
+removed.  Labels and data lines are never removed so addresses are re-resolved
+by the assembler.  Instruction pointer register values are never remembered and
+changing them is treated like reaching labels.  It is assumed that instructions
+are only reached by jumping to labels and are never modified.
+"""
+
+import assembler
+
+IP_REG    = 0
+MODULUS   = 2 ** 32
+ALF_FUNCS = {"add" : lambda a, b : a + b,
+             "sub" : lambda a, b : a - b,
+             "mul" : lambda a, b : a * b,
+             "div" : lambda a, b : a // b if b else 0,
+             "and" : lambda a, b : a & b,
+             "or"  : lambda a, b : a | b}
+JUMPS     = ["zjump", "gjump"]
+N_ARGS    = dict({e : 3 for e in ALF_FUNCS}, zjump = 2, gjump = 3, copy = 2,
+                 load = 2, store = 2, stop = 0)
+
+def parse(line):
+        """
+        Parses lines.
+
+        Returns labels or None and lists of commands and arguments.
+        """
+
+        if ":" in line:
+                index  = line.find(":")
+                result = line[:index], line[index + 1:].split()
+        else:
+                result = None, line.split()
+
+        return result
+
+def unparse(label, inst):
+        """
+        Converts labels and lists of commands and arguments back into lines.
+        """
+
+        inst = " ".join(inst)
+
+        return f"{label}: {inst}" if label is not None else inst
+
+def datum(datum_):
+        """
+        Converts copy data to values.
+
+        Labels and anything else that is not a number are kept as strings.
+        """
+
+        try:
+                result = assembler.number(datum_, assembler.WORD_BITS)
+        except (ValueError, OverflowError):
+                result = datum_
+
+        return result
+
+def parsable(inst):
+        """
+        Determines if lines are instructions the optimizer can parse.
+
+        Other lines are left unchanged like data lines.
+        """
+
+        try:
+                result = bool(inst) and inst[0] in N_ARGS and \
+                         len(inst) == N_ARGS[inst[0]] + 1
+                if result:
+                        args = inst[2:] if inst[0] == "copy" else inst[1:]
+                        for e in args:
+                                assembler.register(e)
+        except (ValueError, OverflowError):
+                result = False
+
+        return result
+
+def jumped(inst, values):
+        """
+        Determines if jumps happen.
+
+        Returns True, False or None if it cannot be determined.
+        """
+
+        regs = [assembler.register(e) for e in inst[1:]]
+        if   IP_REG in regs:
+                result = None
+        elif inst[0] == "gjump" and regs[0] == regs[1]:
+                result = False
+        else:
+                a, b   = [values.get(e) for e in regs[:2]]
+                if   inst[0] == "zjump" and isinstance(a, int):
+                        result = a == 0
+                elif inst[0] == "gjump" and isinstance(a, int) and \
+                                                             isinstance(b, int):
+                        result = a > b
+                else:
+                        result = None
+
+        return result
+
+class Scan:
+        """
+        Implements scans of assembly code.
+
+        Remembers register values and which registers have memory words.
+        Known values are numbers or labels.  Loaded values are tuples of the
+        loaded addresses.
+        """
+
+        def __init__(self):
+                self.values = {}
+                self.mems   = {}
+
+        def forget(self):
+                """
+                Forgets register values and memory words.
+                """
+
+                self.values.clear()
+                self.mems.clear()
+
+        def write(self, reg, value = None):
+                """
+                Records register writes.
+
+                Writing to the instruction pointer register forgets everything.
+                """
+
+                for e in [e for e in self.mems if self.mems[e] == reg]:
+                        del self.mems[e]
+                if   reg == IP_REG:
+                        self.forget()
+                elif value is None:
+                        self.values.pop(reg, None)
+                else:
+                        self.values[reg] = value
+
+        def step(self, inst):
+                """
+                Records the effects of instructions.
+                """
+
+                cmd  = inst[0]
+                regs = [assembler.register(e) for e in inst[1:]] \
+                                              if cmd != "copy" else []
+                if   cmd in ALF_FUNCS:
+                        a, b = [self.values.get(e) for e in regs[:2]]
+                        if   isinstance(a, int) and isinstance(b, int):
+                                value = ALF_FUNCS[cmd](a, b) % MODULUS
+                        elif cmd in ["and", "or"] and regs[0] == regs[1]:
+                                value = a
+                        else:
+                                value = None
+                        self.write(regs[2], value)
+                elif cmd == "copy":
+                        self.write(assembler.register(inst[2]), datum(inst[1]))
+                elif cmd == "load":
+                        address = self.values.get(regs[0])
+                        if isinstance(address, tuple):
+                                address = None
+                        self.write(regs[1], None if address is None
+                                                            else (address,))
+                        if address is not None and regs[1] != IP_REG:
+                                self.mems[address] = regs[1]
+                elif cmd == "store":
+                        self.mems.clear()
+
+def optimize(lines):
+        """
+        Optimizes lists of parsed lines and their line numbers once.
+
+        Labeled lines and the first line may be reached from anywhere so they
+        are never removed.  Returns the optimized lists.
+        """
+
+        labels = {e[0] : i for i, e in enumerate(lines) if e[0] is not None}
+        scan   = Scan()
+        dead   = False
+        result = []
+        skip   = 0
+        for i, (label, inst, line_no) in enumerate(lines):
+                is_inst = parsable(inst)
+                if skip:
+                        skip -= 1
+                        continue
+                fixed   = label is not None or i == 0
+                if fixed or not is_inst:
+                        scan.forget()
+                        dead = False
+                if not is_inst:
+                        result.append((label, inst, line_no))
+                        continue
+                if dead:
+                        continue
+                cmd  = inst[0]
+                regs = [assembler.register(e) for e in inst[1:]] \
+                                              if cmd != "copy" else []
+                if   cmd == "copy":
+                        reg  = assembler.register(inst[2])
+                        load = (None, ["load", inst[2], inst[2]])
+                        if scan.values.get(reg) == datum(inst[1]) and \
+                                              reg != IP_REG and not fixed:
+                                continue
+                        next_ = [e[:2] for e in lines[i + 1:i + 2]]
+                        if next_ == [load] and not fixed and \
+                                      scan.mems.get(datum(inst[1])) == reg:
+                                skip = 1
+                                continue
+                elif cmd == "load":
+                        address = scan.values.get(regs[0])
+                        reg     = scan.mems.get(address) \
+                                  if not isinstance(address, tuple) else None
+                        if reg is not None and not fixed:
+                                if reg == regs[1]:
+                                        continue
+                                prev = result[-1] if result else (0, [], 0)
+                                if prev[0] is None and prev[1][:1] == ["copy"] \
+                                       and regs[0] == regs[1] != reg        \
+                                       and prev[1][2] == inst[1]:
+                                        result.pop()
+                                inst = ["or", f"r{reg}", f"r{reg}", inst[2]]
+                elif cmd in JUMPS:
+                        jump = jumped(inst, scan.values)
+                        if jump is False and not fixed:
+                                continue
+                        dest, seen, jump_ = regs[-1], set(), inst
+                        while scan.values.get(dest) not in seen:
+                                target = scan.values.get(dest)
+                                seen.add(target)
+                                target = lines[labels[target]][1] \
+                                         if target in labels else []
+                                if not parsable(target)    or \
+                                   target[0] not in JUMPS  or \
+                                   not jumped(target, scan.values):
+                                        break
+                                dest = assembler.register(target[-1])
+                                inst = inst[:-1] + [target[-1]]
+                        else:
+                                inst = jump_
+                        dead = bool(jump)
+                elif cmd == "stop":
+                        dead = True
+                scan.step(inst)
+                result.append((label, inst, line_no))
+
+        return result
+
+def optimizer(asm_code):
+        """
+        Implements the optimizer.
+
+        Optimizes until nothing changes.  Returns the optimized assembly code
+        and the number of instructions removed.  Removed lines and comments
+        are left blank so that lines keep their line numbers.
+        """
+
+        result  = asm_code.split("\n")
+        lines   = [(e.strip(), i) for i, e in enumerate(result)]
+        lines   = [parse(e) + (i,) for e, i in lines
+                                            if e and not e.startswith("#")]
+        n_lines = len(lines)
+        while True:
+                lines_ = optimize(lines)
+                if lines_ == lines:
+                        break
+                lines   = lines_
+        result  = len(result) * [""]
+        for label, inst, line_no in lines:
+                result[line_no] = unparse(label, inst)
+        result  = "\n".join(result)
+
+        return result, n_lines - len(lines)
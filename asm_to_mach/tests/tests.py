@@ -27,12 +27,15 @@ Tests the script and assembler.
 
 import unittest
 import subprocess
+import json
 import os
 
-def mach_code(program):
+def mach_code(program, options = None):
+        options = [] if options is None else options
         with open("__program__", "w") as f:
                 f.write(program)
-        mach_code_ = subprocess.check_output(["../asm_to_mach", "__program__"])
+        mach_code_ = subprocess.check_output(["../asm_to_mach"] + options +
+                                                              ["__program__"])
         os.remove("__program__")
 
         return mach_code_
@@ -289,3 +292,194 @@ label_2: zjump r1 r2
                 answer += "ffff0123"
                 answer  = bytes.fromhex(answer)
                 self.assertEqual(output, answer)
+
+        def test_overflow(self):
+                for program in ["copy 0x1000000 r1", "add r1 r16 r2", "-1"]:
+                        with open("__program__", "w") as f:
+                                f.write(program + "\n")
+                        output = subprocess.run(["../asm_to_mach",
+                                                 "__program__"],
+                                                capture_output = True)
+                        os.remove("__program__")
+                        self.assertNotEqual(output.returncode, 0)
+                        self.assertIn(b"OverflowError", output.stderr)
+
+        def test_stream(self):
+                program  = "# Labels are used before and after they are set.\n"
+                program += "copy end r1\n"
+                program += "".join(f"label_{i}: copy label_{i} r2\n"
+                                                        for i in range(20000))
+                program += "end: stop\n"
+                output   = mach_code(program, ["--stream"])
+                answer   = mach_code(program)
+                self.assertEqual(output, answer)
+                self.assertEqual(len(output), 4 * 20002)
+                self.assertEqual(output[:4], bytes.fromhex("80138841"))
+                for e in ["--object", "--optimize", "--listing=__listing__",
+                          "--symbols=__symbols__"]:
+                        output = mach_code(program, ["--stream", e])
+                        self.assertTrue(output.startswith(b"Usage:"))
+                self.assertFalse(os.path.exists("__listing__"))
+                self.assertFalse(os.path.exists("__symbols__"))
+
+        def test_link(self):
+                programs = ["start: copy data r1\n"
+                            "       load r1 r2\n"
+                            "       copy start r3\n"
+                            "       stop\n",
+                            "# Labels can be set in other object code.\n"
+                            "data:  0xbeef\n"
+                            "       start\n"
+                            "       data\n"]
+                objs     = []
+                for i, e in enumerate(programs):
+                        objs.append(f"__object_{i}__")
+                        with open(objs[-1], "wb") as f:
+                                f.write(mach_code(e, ["--object"]))
+                output   = subprocess.check_output(["../link"] + objs)
+                answer   = mach_code("".join(programs))
+                self.assertEqual(output, answer)
+                output   = subprocess.run(["../link"] + objs + objs,
+                                          capture_output = True)
+                self.assertNotEqual(output.returncode, 0)
+                self.assertIn(b"set twice", output.stderr)
+                output   = subprocess.run(["../link"] + objs[:1],
+                                          capture_output = True)
+                self.assertNotEqual(output.returncode, 0)
+                self.assertIn(b"not set", output.stderr)
+
+                programs = ["stop\n"
+                            "stop\n",
+                            "       copy lab.1 r2\n"
+                            "lab.1: lab-2\n"
+                            "lab-2: stop\n"]
+                for e, f_ in zip(programs, objs):
+                        with open(f_, "wb") as f:
+                                f.write(mach_code(e, ["--object"]))
+                output   = subprocess.check_output(["../link"] + objs)
+                answer   = mach_code("".join(programs))
+                self.assertEqual(output, answer)
+                self.assertEqual(output[8:16].hex(), "800000c200000010")
+                for e in objs:
+                        os.remove(e)
+
+        def test_optimize(self):
+                program = \
+"""
+        copy  0x7      r5
+        copy  const_1  r2
+        load  r2       r2
+        copy  const_1  r2
+        load  r2       r2
+        copy  const_1  r3
+        load  r3       r3
+        copy  0x5      r4
+        copy  0x5      r4
+        copy  0x0      r1
+        copy  done     r7
+        copy  hop      r6
+        zjump r1       r6
+        add   r2       r2 r2
+        stop
+hop:    zjump r1       r7
+        stop
+done:   add   r4       r5 r8
+        copy  0x4      r9
+        gjump r9       r4 r6
+        stop
+const_1: 0xc0000000
+"""
+                answer  = mach_code(program)
+                with open("__program__", "w") as f:
+                        f.write(program)
+                output  = subprocess.run(["../asm_to_mach", "--optimize",
+                                          "__program__"], capture_output = True)
+                self.assertEqual(output.stderr, b"instructions removed: 6\n"
+                                                b"cycles saved: 5\n")
+                output  = output.stdout
+                self.assertEqual(len(answer) - len(output), 4 * 6)
+                states  = []
+                for e in [answer, output]:
+                        with open("__program__", "wb") as f:
+                                f.write(e)
+                        state = subprocess.check_output(
+                                                 ["../../computer/computer",
+                                                  "--output=json",
+                                                  "__program__"])
+                        state = json.loads(state)["registers"]
+                        states.append([state[i] for i in [1, 2, 3, 4, 5, 8, 9]])
+                os.remove("__program__")
+                self.assertEqual(states[0], states[1])
+                self.assertEqual(states[0][:5],
+                                 [0, 0xc0000000, 0xc0000000, 5, 7])
+
+                program = \
+"""
+        copy  0x0 r1
+        copy  end r2
+        zjump r1  r2
+end:    stop
+        copy  0x5 r3
+"""
+                with open("__program__", "w") as f:
+                        f.write(program)
+                output  = subprocess.run(["../asm_to_mach", "--optimize",
+                                          "__program__"], capture_output = True)
+                self.assertEqual(output.stderr, b"instructions removed: 1\n"
+                                                b"cycles saved: 0\n")
+                states  = []
+                for e in [mach_code(program), output.stdout]:
+                        with open("__program__", "wb") as f:
+                                f.write(e)
+                        state = subprocess.check_output(
+                                                 ["../../computer/computer",
+                                                  "--output=json",
+                                                  "__program__"])
+                        states.append(json.loads(state)["registers"])
+                os.remove("__program__")
+                self.assertEqual(states[0], states[1])
+                program = "copy lab.1 r2\ncopy lab.1 r2\nlab.1: stop\n"
+                with open("__program__", "w") as f:
+                        f.write(program)
+                output  = subprocess.run(["../asm_to_mach", "--optimize",
+                                          "__program__"], capture_output = True)
+                os.remove("__program__")
+                self.assertEqual(output.stderr, b"instructions removed: 1\n"
+                                                b"cycles saved: 1\n")
+                answer  = mach_code("copy lab.1 r2\nlab.1: stop\n")
+                self.assertEqual(output.stdout, answer)
+
+        def test_listing(self):
+                program = \
+"""
+# This comment is not listed.
+start: copy  end r1
+
+       load  r1  r2
+end:   stop
+       0xbeef
+"""
+                answer  = mach_code(program)
+                with open("__program__", "w") as f:
+                        f.write(program)
+                output  = subprocess.check_output(["../asm_to_mach",
+                                                   "--listing=__listing__",
+                                                   "--symbols=__symbols__",
+                                                   "__program__"])
+                self.assertEqual(output, answer)
+                with open("__listing__") as f:
+                        output = f.read()
+                answer  = "0x00000000: 0x80000081  start          " \
+                          "        3  start: copy  end r1\n"
+                answer += "0x00000004: 0x91200000  start          " \
+                          "        5  load  r1  r2\n"
+                answer += "0x00000008: 0xb0000000  end            " \
+                          "        6  end:   stop\n"
+                answer += "0x0000000c: 0x0000beef  end            " \
+                          "        7  0xbeef\n"
+                self.assertEqual(output, answer)
+                with open("__symbols__") as f:
+                        output = json.load(f)
+                self.assertEqual(output, {"start" : 0, "end" : 8})
+                for e in ["__program__", "__listing__", "__symbols__"]:
+                        os.remove(e)
@@ -0,0 +1,1257 @@
+"""
+Copyright 2025 Christian Seberino
+
+This file is part of Pylayers.
+
+Pylayers is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+Pylayers is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+Pylayers. If not, see <https://www.gnu.org/licenses/>.
+
+________________________________________________________________________________
+
+
+Contains the computer.
+
+Executes machine code in files.  Machine code is composed of four byte words of
+instructions and data.  Instructions contain commands and their arguments.
+Command arguments can be registers or data.  The registers store words.  Bytes
+are also stored in the memory.  The memory can store 2^20 or a little over one
+million bytes.  Each memory byte has an index referred to as its address.  All
+the values stored in the registers and the memory are referred to as the state
+of the computer.  When execution begins, the register values are all set to zero
+and the machine code is copied into the memory beginning at address zero.  Then,
+the instruction word in memory beginning at address zero is read and executed.
+The process of reading and executing instructions is referred to as the
+instruction cycle.  The first nibbles or four bits of instructions denote
+commands.  The computer has 16 registers so instruction command register
+arguments also only require nibbles.  The first register is referred to as the
+instruction pointer.  Its value specifies memory addresses containing
+instructions to be executed in instruction cycles.  There are six arithmetic and
+logic commands: add, sub, mul, div, and and or.  These all operate on values in
+registers and store their results in registers.  There are two commands that
+modify the instruction pointer if certain conditions are met: zjump and gjump.
+The condition for zjump is a register value being zero.  The condition for gjump
+is a register value being greater than another register value.  Modifications to
+the instruction pointer are referred to as jumps.  The copy command copies
+argument data into registers.  The load command copies memory words into
+registers.  The store command copies register words into memory.  Executions
+continue until stop instructions are reached.  All named size constants are
+specified in bytes.
+
+Each line in the following table describes one of the twelve instruction types.
+ip, r1, r2 and r3 denote registers.  ip denotes the instruction pointer while
+r1, r2 and r3 can all be any of the 16 registers.  [r1], [r2] and [r3] denote
+the corresponding register values.  <datum> denotes one, two or three bytes.
+The m function returns memory words beginning at given addresses.  Arrows point
+to where the results of instruction cycles are stored:
+
+================================================================================
+ command          arguments        execution
+================================================================================
+
+ add              r1, r2, r3       ([r1] + [r2]) % 2^32             ->  r3
+ sub              r1, r2, r3       ([r1] - [r2]) % 2^32             ->  r3
+ mul              r1, r2, r3       ([r1] * [r2]) % 2^32             ->  r3
+ div              r1, r2, r3       ([r1] / [r2]) % 2^32             ->  r3
+ and              r1, r2, r3       [r1] & [r2]                      ->  r3
+ or               r1, r2, r3       [r1] | [r2]                      ->  r3
+ zjump            r1, r2           [r2] - 4 if [r1] = 0    else ip  ->  ip
+ gjump            r1, r2, r3       [r3] - 4 if [r1] > [r2] else ip  ->  ip
+ copy             <datum>, r1      <datum> zero padded to one word  ->  r1
+ load             r1, r2           m([r1])                          ->  r2
+ store            r1, r2           [r1]                             ->  m([r2])
+ stop
+
+================================================================================
+
+Basic blocks of instructions can be translated into Python functions which are
+then run.  Basic blocks are instruction sequences that end with jumps, stops or
+modifications of the instruction pointer.  Decoded instructions and translated
+blocks are discarded when stores modify them.  The memory is divided into pages
+which are only allocated when first written to.
+
+The printer is mapped to the word at address 0xfffffc.  When printers are
+attached, storing words there prints their lowest bytes.  Printed bytes are
+buffered and written in bulk.
+"""
+
+import multiprocessing
+import collections
+import functools
+import operator
+import itertools
+import hashlib
+import struct
+import json
+import math
+import zlib
+import time
+import sys
+import os
+
+CMDS      = ["add", "sub", "mul", "div", "and_", "or_", "zjump", "gjump",
+                                                "copy", "load", "store", "stop"]
+IP_REG    = 0
+N_REGS    = 16
+NIBB_BITS = 4
+BYTE_BITS = 8
+WORD_SIZE = 4
+MEM_SIZE  = 2 ** 20
+MODULUS   = 2 ** (BYTE_BITS * WORD_SIZE)
+ALF_FUNCS = {"add"  : operator.add,
+             "sub"  : operator.sub,
+             "mul"  : operator.mul,
+             "div"  : operator.floordiv,
+             "and_" : operator.and_,
+             "or_"  : operator.or_}
+ALF_SRC   = {"add"  : f"({{0}} + {{1}}) % {MODULUS}",
+             "sub"  : f"({{0}} - {{1}}) % {MODULUS}",
+             "mul"  : f"({{0}} * {{1}}) % {MODULUS}",
+             "div"  : "({0} // {1} if {1} else 0)",
+             "and_" : "({0} & {1})",
+             "or_"  : "({0} | {1})"}
+JUMPS     = ["zjump", "gjump", "stop"]
+BLOCK_LEN = 2 ** 10
+WORD      = struct.Struct(">I")
+PAGE_BITS = 12
+PAGE_SIZE = 2 ** PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+SLICE_LEN = 2 ** 16
+HEADER    = struct.Struct(f">32sQQ?{N_REGS}Q")
+RECORD    = struct.Struct(">IIBII")
+SNAP_HEAD = struct.Struct(">QI")
+TRACE_END = struct.Struct(">8sQQQ")
+TRACE_TAG = b"PLTRACE2"
+SNAP_LEN  = 2 ** 16
+MAX_SNAPS = 2 ** 6
+PRINTER   = 0xfffffc
+PRINT_LEN = 2 ** 12
+
+class Printer:
+        """
+        Implements the printer.
+
+        The printer is a device mapped to the word at the printer address.
+        Storing words there prints their lowest bytes.  Printed bytes are
+        buffered and written to streams when the buffers fill or are flushed.
+        """
+
+        def __init__(self, stream, size = PRINT_LEN):
+                self.stream = stream
+                self.size   = size
+                self.buffer = bytearray()
+
+        def print_(self, word):
+                """
+                Prints the lowest bytes of words.
+                """
+
+                self.buffer.append(word & 0xff)
+                if len(self.buffer) >= self.size:
+                        self.flush()
+
+        def flush(self):
+                """
+                Writes the buffers to the streams.
+                """
+
+                if self.buffer:
+                        self.stream.write(self.buffer)
+                        self.stream.flush()
+                        self.buffer = bytearray()
+
+class Memory:
+        """
+        Implements the memory.
+
+        The memory is divided into pages that are only allocated when written
+        to.  Reading unallocated pages gives zeros.  Bytes outside the address
+        space are never read or written.  Words below last are accessed in
+        place.  Printers can be attached which also lowers last below the
+        printer address.
+        """
+
+        def __init__(self, image = b"", size = MEM_SIZE, printer = None):
+                self.size          = size
+                self.printer       = printer
+                self.last          = size - WORD_SIZE
+                self.pages         = {}
+                self[0:len(image)] = image
+                if printer:
+                        self.last  = min(size, PRINTER) - WORD_SIZE
+
+        def __len__(self):
+                return self.size
+
+        def __bytes__(self):
+                return bytes(self[0:self.size])
+
+        def __getitem__(self, slice_):
+                start, stop, _ = slice_.indices(self.size)
+                result         = bytearray()
+                while start < stop:
+                        page    = self.pages.get(start >> PAGE_BITS)
+                        offset  = start & PAGE_MASK
+                        end     = min(offset + stop - start, PAGE_SIZE)
+                        result += page[offset:end] if page else \
+                                                   bytes(end - offset)
+                        start  += end - offset
+
+                return result
+
+        def __setitem__(self, slice_, data):
+                start, stop, _ = slice_.indices(self.size)
+                data           = data[:max(stop - start, 0)]
+                while data:
+                        page                       = self.page(start)
+                        offset                     = start & PAGE_MASK
+                        size                       = min(len(data),
+                                                         PAGE_SIZE - offset)
+                        page[offset:offset + size] = data[:size]
+                        data, start                = data[size:], start + size
+
+        def page(self, address):
+                """
+                Gets pages.
+
+                Pages are allocated if needed.
+                """
+
+                if address >> PAGE_BITS not in self.pages:
+                        self.pages[address >> PAGE_BITS] = bytearray(PAGE_SIZE)
+
+                return self.pages[address >> PAGE_BITS]
+
+        def load_word(self, address):
+                """
+                Reads words.
+
+                Words within pages are unpacked in place.  Words extending past
+                the end of the address space are made from the bytes in it.
+                """
+
+                offset = address & PAGE_MASK
+                if offset <= PAGE_SIZE - WORD_SIZE and address <= self.last:
+                        page   = self.pages.get(address >> PAGE_BITS)
+                        result = WORD.unpack_from(page, offset)[0] if page \
+                                                                      else 0
+                else:
+                        result = self[address:address + WORD_SIZE]
+                        result = int.from_bytes(result, "big")
+
+                return result
+
+        def store_word(self, address, word):
+                """
+                Writes words.
+
+                Words within pages are packed in place.  Words stored at the
+                printer address are printed when printers are attached.
+                """
+
+                offset = address & PAGE_MASK
+                if offset <= PAGE_SIZE - WORD_SIZE and address <= self.last:
+                        WORD.pack_into(self.page(address), offset, word)
+                elif address == PRINTER and self.printer:
+                        self.printer.print_(word)
+                else:
+                        self[address:address + WORD_SIZE] = \
+                                                 word.to_bytes(WORD_SIZE, "big")
+
+def reg_args(inst):
+        """
+        Extracts register numbers from instructions.
+
+        Instructions are encoded in bytearray objets.
+        """
+
+        return inst[0] & 0xf, inst[1] >> NIBB_BITS, inst[1] & 0xf
+
+def _func(cmd):
+        """
+        helper function for arithmetic and logic commands.
+
+        Returns functions implementing commands.
+        """
+
+        def func(inst, regs, memory):
+                a, b, c = reg_args(inst)
+                try:
+                        regs[c] = ALF_FUNCS[cmd](regs[a], regs[b]) % MODULUS
+                except ZeroDivisionError:
+                        regs[c] = 0
+
+        return func
+
+for e in ["add", "sub", "mul", "div", "and_", "or_"]:
+        globals()[e] = _func(e)
+
+def zjump(inst, regs, memory):
+        """
+        Modifies the instruction pointer.
+
+        Modifications only occur when a specificed register value is zero.
+        """
+
+        a, b, _      = reg_args(inst)
+        regs[IP_REG] = regs[b] - WORD_SIZE if regs[a] == 0 else regs[IP_REG]
+
+def gjump(inst, regs, memory):
+        """
+        Modifies the instruction pointer.
+
+        Modifications only occur when a specificed register value is greater
+        than another specified register value.
+        """
+
+        a, b, c      = reg_args(inst)
+        cond         = (regs[a] > regs[b])
+        regs[IP_REG] = regs[c] - WORD_SIZE if cond else regs[IP_REG]
+
+def copy(inst, regs, memory):
+        """
+        Copies data in instructions into registers.
+
+        The data is limited to three bytes.
+        """
+
+        a       = inst[3] & 0xf
+        regs[a] = (int.from_bytes(inst, "big") & 0x0ffffff0) >> NIBB_BITS
+
+def load(inst, regs, memory):
+        """
+        Copies data in memory into registers.
+
+        The data is limited to one word.
+        """
+
+        a, b, _ = reg_args(inst)
+        regs[b] = memory.load_word(regs[a])
+
+def store(inst, regs, memory):
+        """
+        Copies data in registers into memory.
+
+        All register data is limited to one word.
+        """
+
+        a, b, _ = reg_args(inst)
+        memory.store_word(regs[b], regs[a])
+
+def stop(inst, regs, memory):
+        """
+        Does nothing.
+
+        Leads to the computer stopping.
+        """
+
+        pass
+
+def decode(inst, invalidate):
+        """
+        Decodes instructions.
+
+        Returns commands and functions that execute the instructions given the
+        registers and memory.  Register numbers and data are extracted once.
+        Stores pass the addresses they write to to invalidate.
+        """
+
+        cmd     = CMDS[inst[0] >> NIBB_BITS]
+        a, b, c = reg_args(inst)
+        if   cmd in ALF_FUNCS:
+                alf = ALF_FUNCS[cmd]
+                def func(regs, memory):
+                        try:
+                                regs[c] = alf(regs[a], regs[b]) % MODULUS
+                        except ZeroDivisionError:
+                                regs[c] = 0
+        elif cmd == "zjump":
+                def func(regs, memory):
+                        if regs[a] == 0:
+                                regs[IP_REG] = regs[b] - WORD_SIZE
+        elif cmd == "gjump":
+                def func(regs, memory):
+                        if regs[a] > regs[b]:
+                                regs[IP_REG] = regs[c] - WORD_SIZE
+        elif cmd == "copy":
+                a     = inst[3] & 0xf
+                datum = (int.from_bytes(inst, "big") & 0x0ffffff0) >> NIBB_BITS
+                def func(regs, memory):
+                        regs[a] = datum
+        elif cmd == "load":
+                def func(regs, memory):
+                        regs[b] = memory.load_word(regs[a])
+        elif cmd == "store":
+                def func(regs, memory):
+                        memory.store_word(regs[b], regs[a])
+                        invalidate(regs[b])
+        else:
+                def func(regs, memory):
+                        pass
+
+        return cmd, func
+
+def block_insts(memory, start):
+        """
+        Finds basic blocks.
+
+        Returns the decoded instructions of the blocks beginning at given
+        addresses.  Blocks end with jumps, stops, instructions that modify the
+        instruction pointer and instructions that cannot be decoded.
+        """
+
+        result = []
+        for address in range(start, start + WORD_SIZE * BLOCK_LEN, WORD_SIZE):
+                inst = memory[address:address + WORD_SIZE]
+                if len(inst) < WORD_SIZE or inst[0] >> NIBB_BITS >= len(CMDS):
+                        break
+                cmd     = CMDS[inst[0] >> NIBB_BITS]
+                a, b, c = reg_args(inst)
+                if cmd == "copy":
+                        a = inst[3] & 0xf
+                        b = (int.from_bytes(inst, "big") & 0x0ffffff0) >> \
+                                                                     NIBB_BITS
+                result.append((address, cmd, a, b, c))
+                dest = {"copy" : a, "load" : b}.get(cmd, c)
+                if cmd in JUMPS or (dest == IP_REG and cmd not in ["store"]):
+                        break
+
+        return result
+
+def block_src(insts):
+        """
+        Generates the Python source code of basic blocks.
+
+        Register values are kept in local variables and only written back when
+        blocks are exited.  Instruction pointer values are known when
+        instructions are translated.  Jumps back to block beginnings stay in
+        the blocks unless that could exceed the step limit.  Stores that
+        modify translated instructions invalidate the blocks containing them
+        and exit.  Blocks return the last commands and the step counts.
+        """
+
+        start, end = insts[0][0], insts[-1][0] + WORD_SIZE
+        regs       = set()
+        for _, cmd, a, b, c in insts:
+                regs |= {"copy" : {a}, "stop" : set()}.get(cmd, {a, b, c})
+        regs      -= {IP_REG}
+        def exit(ip, cmd, indent, steps):
+                lines  = [f"regs[{e}] = r{e}" for e in sorted(regs)]
+                lines += [f"regs[{IP_REG}] = {ip}"]
+                lines += [f"return {cmd!r}, n + {steps}"]
+
+                return [indent * " " + e for e in lines]
+
+        lines  = [f"def block(regs, memory, limit):"]
+        lines += [f"        n = 0"]
+        lines += [f"        r{e} = regs[{e}]" for e in sorted(regs)]
+        lines += [f"        pages, last = memory.pages, memory.last"]
+        lines += [f"        load, store = memory.load_word, memory.store_word"]
+        lines += [f"        page, flags = memory.page, code.pages"]
+        lines += [f"        while True:"]
+        fast   = f"o <= {PAGE_SIZE - WORD_SIZE} and {{0}} <= last"
+        for k, (address, cmd, a, b, c) in enumerate(insts, 1):
+                r  = lambda e : f"r{e}" if e != IP_REG else str(address)
+                ip = address + WORD_SIZE
+                if   cmd in ALF_SRC:
+                        val  = ALF_SRC[cmd].format(r(a), r(b))
+                        dest = c
+                elif cmd == "copy":
+                        val, dest = str(b), a
+                elif cmd == "load":
+                        val  = f"load({r(a)})"
+                        dest = b
+                if   cmd in ["zjump", "gjump"]:
+                        cond, dest = {"zjump" : (f"{r(a)} == 0", r(b)),
+                                      "gjump" : (f"{r(a)} > {r(b)}", r(c))}[cmd]
+                        lines += [f"{16 * ' '}if {cond}:"]
+                        lines += [f"{24 * ' '}if {dest} == {start}:"]
+                        lines += [f"{32 * ' '}n += {k}"]
+                        lines += [f"{32 * ' '}if n + {k} <= limit:"]
+                        lines += [f"{40 * ' '}continue"]
+                        lines += exit(start, cmd, 32, 0)
+                        lines += exit(dest, cmd, 24, k)
+                        lines += exit(ip, cmd, 16, k)
+                elif cmd == "store":
+                        n      = f"{r(b)} >> {PAGE_BITS}"
+                        lines += [f"{16 * ' '}o = {r(b)} & {PAGE_MASK}"]
+                        lines += [f"{16 * ' '}if {fast.format(r(b))}:"]
+                        lines += [f"{24 * ' '}p = pages.get({n})"]
+                        lines += [f"{24 * ' '}if p is None:"]
+                        lines += [f"{32 * ' '}p = page({r(b)})"]
+                        lines += [f"{24 * ' '}pack(p, o, {r(a)})"]
+                        lines += [f"{24 * ' '}f   = flags.get({n})"]
+                        lines += [f"{24 * ' '}hit = f is not None and "
+                                  f"f.find(1, o, o + {WORD_SIZE}) >= 0"]
+                        lines += [f"{16 * ' '}else:"]
+                        lines += [f"{24 * ' '}store({r(b)}, {r(a)})"]
+                        lines += [f"{24 * ' '}hit = True"]
+                        lines += [f"{16 * ' '}if hit and invalidate({r(b)}):"]
+                        lines += exit(ip, cmd, 24, k)
+                elif cmd == "load" and dest != IP_REG:
+                        n      = f"{r(a)} >> {PAGE_BITS}"
+                        lines += [f"{16 * ' '}o = {r(a)} & {PAGE_MASK}"]
+                        lines += [f"{16 * ' '}if {fast.format(r(a))}:"]
+                        lines += [f"{24 * ' '}p = pages.get({n})"]
+                        lines += [f"{24 * ' '}r{dest} = unpack(p, o)[0] if p "
+                                  f"is not None else 0"]
+                        lines += [f"{16 * ' '}else:"]
+                        lines += [f"{24 * ' '}r{dest} = {val}"]
+                elif cmd == "stop":
+                        lines += exit(ip, cmd, 16, k)
+                elif dest == IP_REG:
+                        lines += exit(f"{val} + {WORD_SIZE}", cmd, 16, k)
+                else:
+                        lines += [f"                r{dest} = {val}"]
+        if not lines[-1].startswith(16 * " " + "return"):
+                lines += exit(end, cmd, 16, k)
+
+        return "\n".join(lines) + "\n"
+
+def translate(memory, start, invalidate, code):
+        """
+        Translates basic blocks into Python functions.
+
+        The functions take the registers, memory and step limits.  Translated
+        instructions are marked in code which is a memory of flags.  Returns
+        the functions, block ends and block lengths.  Returns None for blocks
+        that cannot be translated.
+        """
+
+        insts = block_insts(memory, start)
+        if insts:
+                end             = insts[-1][0] + WORD_SIZE
+                code[start:end] = (end - start) * b"\x01"
+                namespace       = {"code"       : code,
+                                   "invalidate" : invalidate,
+                                   "unpack"     : WORD.unpack_from,
+                                   "pack"       : WORD.pack_into}
+                exec(block_src(insts), namespace)
+                result          = namespace["block"], end, len(insts)
+        else:
+                result          = None
+
+        return result
+
+class Profile:
+        """
+        Implements execution profiles.
+
+        Profiles count the commands executed, the instruction addresses
+        executed, the jumps taken and not taken and the addresses loaded and
+        stored.  The steps and wall times of runs are also recorded.
+        """
+
+        def __init__(self):
+                self.cmds      = collections.Counter()
+                self.addresses = collections.Counter()
+                self.taken     = collections.Counter()
+                self.jumps     = {e : [0, 0] for e in ["zjump", "gjump"]}
+                self.loads     = collections.Counter()
+                self.stores    = collections.Counter()
+                self.steps     = 0
+                self.time      = 0.0
+
+        def record(self, address, cmd, a, b):
+                """
+                Records instruction cycles.
+
+                a and b are the values of the first two register arguments
+                before execution.  Jump counts are pairs of taken and not taken
+                counts.
+                """
+
+                self.cmds[cmd]          += 1
+                self.addresses[address] += 1
+                self.steps              += 1
+                if   cmd in self.jumps:
+                        taken                          = (a == 0) if \
+                                                 cmd == "zjump" else (a > b)
+                        self.jumps[cmd][not taken]    += 1
+                        self.taken[address]           += taken
+                elif cmd == "load":
+                        self.loads[a]                 += 1
+                elif cmd == "store":
+                        self.stores[b]                += 1
+
+        def json(self):
+                """
+                Exports profiles as JSON.
+
+                Addresses are written in hexadecimal.  Jump ratios are the
+                fractions of jumps taken.
+                """
+
+                hex_   = lambda counts : {f"{e:#010x}" : counts[e]
+                                                        for e in sorted(counts)}
+                jumps  = {e : {"taken"     : t,
+                               "not_taken" : n,
+                               "ratio"     : t / (t + n) if t + n else None}
+                                            for e, (t, n) in self.jumps.items()}
+                result = {"steps"     : self.steps,
+                          "time"      : self.time,
+                          "ips"       : self.steps / self.time if self.time
+                                                               else None,
+                          "cmds"      : {e : self.cmds[e] for e in CMDS},
+                          "addresses" : hex_(self.addresses),
+                          "jumps"     : jumps,
+                          "loads"     : hex_(self.loads),
+                          "stores"    : hex_(self.stores)}
+
+                return json.dumps(result, indent = 8)
+
+        def listing(self, memory, labels = None):
+                """
+                Creates annotated listings.
+
+                Every executed instruction is listed with its label, hit count
+                and share of the steps.  Jumps also list the times taken.
+                Labels map label names to addresses like in the assembler.
+                """
+
+                labels = {} if labels is None else labels
+                names  = {address : name for name, address in labels.items()}
+                result = ""
+                for address in sorted(self.addresses):
+                        hits    = self.addresses[address]
+                        word    = memory[address:address + WORD_SIZE].hex()
+                        cmd     = CMDS[int(word[0], 16)] if word else ""
+                        label   = names.get(address, "")
+                        label   = label + ":" if label else label
+                        result += f"{address:#010x}: 0x{word:<8}  {label:<16}" \
+                                  f"{cmd.rstrip('_'):<6}{hits:>12}" \
+                                  f"{100 * hits / self.steps:>8.2f}%"
+                        if cmd in self.jumps:
+                                result += f"{self.taken[address]:>12} taken"
+                        result += "\n"
+
+                return result
+
+class Trace:
+        """
+        Implements execution traces.
+
+        Traces are sequences of fixed width binary records.  Each record
+        contains an instruction address, the instruction word, the register
+        written, its new value and the memory address written.  Instruction
+        pointer values are only recorded when instructions write them
+        explicitly and then include the increments.  Stores record the words
+        stored, the memory addresses they are stored at and no registers.
+        Records are written to binary files or kept in ring buffers holding
+        the last records.  Checkpoints are also kept as periodic snapshots.
+        When there are too many snapshots every other one is dropped and the
+        period is doubled.  Ring buffers instead keep snap_len extra records
+        and drop the snapshots before their oldest records so that all of the
+        last size steps can be replayed.  Their periods are at most size and
+        at least size divided by MAX_SNAPS.  Closing trace files appends the snapshots and the
+        step of the first record so that they can be replayed later.
+        """
+
+        def __init__(self, file = None, size = None, snap_len = SNAP_LEN):
+                if size:
+                        snap_len = min(max(snap_len, -(-size // MAX_SNAPS)),
+                                       size)
+                self.file      = file
+                self.size      = size
+                self.snap_len  = snap_len
+                self.slots     = size + snap_len if size else None
+                self.records   = bytearray(self.slots * RECORD.size if size
+                                                                      else 0)
+                self.count     = 0
+                self.first     = None
+                self.snapshots = {}
+
+        def append(self, address, inst, reg, value, target = 0):
+                """
+                Appends records.
+                """
+
+                record = RECORD.pack(address, inst, reg, value, target)
+                start  = (self.count % self.slots) * RECORD.size if self.size \
+                                                                     else None
+                if   self.file:
+                        self.file.write(record)
+                elif self.size:
+                        self.records[start:start + RECORD.size] = record
+                else:
+                        self.records += record
+                self.count += 1
+
+        def snapshot(self, step, checkpoint):
+                """
+                Adds snapshots.
+
+                The first snapshot is always kept unless it is before the
+                oldest record of a ring buffer.
+                """
+
+                self.snapshots[step] = checkpoint
+                if   self.size:
+                        oldest          = self.first + self.count - self.slots
+                        self.snapshots  = {e : self.snapshots[e]
+                                           for e in self.snapshots
+                                           if e >= oldest}
+                elif len(self.snapshots) > MAX_SNAPS:
+                        self.snap_len  *= 2
+                        first           = min(self.snapshots)
+                        self.snapshots  = {e : self.snapshots[e]
+                                           for e in self.snapshots
+                                           if e % self.snap_len == 0 or
+                                                                  e == first}
+
+        def record(self, i):
+                """
+                Gets records.
+
+                Records are numbered from zero.  Returns addresses, instruction
+                words, registers written, values and memory addresses written.
+                """
+
+                if   self.file:
+                        end    = self.file.tell()
+                        self.file.seek(i * RECORD.size)
+                        result = RECORD.unpack(self.file.read(RECORD.size))
+                        self.file.seek(end)
+                elif self.size:
+                        if i < self.count - self.slots:
+                                raise ValueError(f"record {i} was overwritten")
+                        result = RECORD.unpack_from(self.records,
+                                               (i % self.slots) * RECORD.size)
+                else:
+                        result = RECORD.unpack_from(self.records,
+                                                    i * RECORD.size)
+
+                return result
+
+        def close(self):
+                """
+                Closes trace files.
+
+                The snapshots and the end are written after the records.
+                """
+
+                self.file.seek(self.count * RECORD.size)
+                for step, checkpoint in sorted(self.snapshots.items()):
+                        self.file.write(SNAP_HEAD.pack(step, len(checkpoint)))
+                        self.file.write(checkpoint)
+                self.file.write(TRACE_END.pack(TRACE_TAG,
+                                               self.first or 0,
+                                               self.count,
+                                               len(self.snapshots)))
+                self.file.close()
+
+def open_trace(file):
+        """
+        Opens closed trace files.
+
+        Returns traces with their record counts, first steps and snapshots.
+        """
+
+        result = Trace(file)
+        file.seek(-TRACE_END.size, os.SEEK_END)
+        tag, result.first, result.count, n_snaps = \
+                                        TRACE_END.unpack(file.read())
+        if tag != TRACE_TAG:
+                raise ValueError("not a closed trace file")
+        file.seek(result.count * RECORD.size)
+        for i in range(n_snaps):
+                step, len_               = SNAP_HEAD.unpack(
+                                                   file.read(SNAP_HEAD.size))
+                result.snapshots[step]   = file.read(len_)
+
+        return result
+
+def replay(image, trace, step):
+        """
+        Replays traces.
+
+        Rebuilds computers at given steps from the images and the last
+        snapshots before the steps.  The records after the snapshots are
+        applied without executing instructions.  Traces without snapshots are
+        replayed from the beginning.
+        """
+
+        first  = trace.first or 0
+        start  = max([e for e in trace.snapshots if e <= step],
+                     default = first)
+        if not first <= start <= step <= first + trace.count:
+                raise ValueError(f"step {step} is not in the trace")
+        result = Computer()
+        result.load(image)
+        if   start in trace.snapshots:
+                result.resume(trace.snapshots[start])
+        elif start:
+                raise ValueError(f"no snapshot before step {step}")
+        regs   = result.regs
+        for i in range(start, step):
+                address, inst, reg, value, target = trace.record(i - first)
+                cmd          = CMDS[inst >> (WORD_SIZE * BYTE_BITS - NIBB_BITS)]
+                regs[IP_REG] = address + WORD_SIZE
+                if   reg < N_REGS:
+                        regs[reg] = value
+                elif cmd == "store":
+                        result.memory.store_word(target, value)
+                result.stopped = (cmd == "stop")
+        result.steps = step
+
+        return result
+
+class Computer:
+        """
+        Implements the computer.
+
+        Machine code images are loaded into the memory and run.  Decoded
+        instructions and translated basic blocks are cached by address.  Their
+        bytes are marked in code so that stores into them invalidate them.
+        Runs can be profiled and traced one instruction at a time.  Printers
+        print to streams.
+        """
+
+        def __init__(self, mem_size = MEM_SIZE, blocks = False,
+                           profile = False, trace = None, stream = None):
+                self.mem_size = mem_size
+                self.blocks   = blocks
+                self.profile  = Profile() if profile else None
+                self.trace    = trace
+                self.printer  = Printer(stream) if stream else None
+                self.load(b"")
+
+        def load(self, image):
+                """
+                Loads machine code images.
+
+                Resets the registers, memory, caches, step count and profile.
+                """
+
+                self.image       = bytes(image)
+                self.regs        = N_REGS * [0]
+                self.memory      = Memory(image, self.mem_size, self.printer)
+                self.code        = Memory(size = self.mem_size)
+                self.inst_cache  = {}
+                self.block_cache = {}
+                self.steps       = 0
+                self.stopped     = False
+                if self.profile is not None:
+                        self.profile = Profile()
+
+        def invalidate(self, address):
+                """
+                Invalidates cached instructions.
+
+                Removes the decoded instructions and translated blocks
+                overlapping words written to given addresses.  Returns the
+                addresses of the removed blocks.  Code flags within pages are
+                checked in place and only words extending past pages are
+                copied.
+                """
+
+                result = []
+                offset = address & PAGE_MASK
+                if offset <= PAGE_SIZE - WORD_SIZE:
+                        flags = self.code.pages.get(address >> PAGE_BITS)
+                        hit   = flags is not None and \
+                                flags.find(1, offset, offset + WORD_SIZE) >= 0
+                else:
+                        hit   = any(self.code[address:address + WORD_SIZE])
+                if hit:
+                        for e in range(address - WORD_SIZE + 1,
+                                       address + WORD_SIZE):
+                                self.inst_cache.pop(e, None)
+                        result = [e for e, block in self.block_cache.items()
+                                          if block and e < address + WORD_SIZE
+                                                   and block[1] > address]
+                        for e in result:
+                                del self.block_cache[e]
+
+                return result
+
+        def step(self):
+                """
+                Implements instruction cycles.
+
+                Gets instructions from memory and executes them.  After every
+                instruction cycle the instruction pointer is incremented by the
+                word size.  Returns instruction commands.
+                """
+
+                address = self.regs[IP_REG]
+                if address not in self.inst_cache:
+                        end                      = address + WORD_SIZE
+                        inst                     = self.memory[address:end]
+                        self.inst_cache[address] = decode(inst, self.invalidate)
+                        self.code[address:end]   = WORD_SIZE * b"\x01"
+                cmd, func          = self.inst_cache[address]
+                func(self.regs, self.memory)
+                self.regs[IP_REG] += WORD_SIZE
+                self.steps        += 1
+                self.stopped       = (cmd == "stop")
+
+                return cmd
+
+        def block(self):
+                """
+                Gets translated basic blocks.
+
+                Gets the blocks beginning at the instruction pointer.  Blocks
+                are translated when first needed.
+                """
+
+                address = self.regs[IP_REG]
+                if address not in self.block_cache:
+                        self.block_cache[address] = translate(self.memory,
+                                                              address,
+                                                              self.invalidate,
+                                                              self.code)
+
+                return self.block_cache[address]
+
+        def run(self, max_steps = None, timeout = None):
+                """
+                Runs the computer.
+
+                Executes instructions until a stop instruction is reached, the
+                maximum number of steps is executed or the timeout in seconds
+                expires.  Timeouts are checked between slices of steps.  Basic
+                blocks are only run when they cannot exceed the maximum.
+                Profiled runs execute one instruction at a time.  Printers are
+                flushed at the end.  Returns whether the computer stopped.
+                """
+
+                end = self.steps + max_steps if max_steps is not None else \
+                                                                       math.inf
+                if timeout is None:
+                        self.run_to(end)
+                else:
+                        end_time = time.monotonic() + timeout
+                        while not self.stopped and self.steps < end and \
+                                                  time.monotonic() < end_time:
+                                self.run_to(min(self.steps + SLICE_LEN, end))
+                if self.printer:
+                        self.printer.flush()
+
+                return self.stopped
+
+        def run_to(self, end):
+                """
+                Runs the computer until step counts are reached.
+
+                Chooses between basic blocks, traced instruction cycles,
+                profiled instruction cycles and instruction cycles.
+                """
+
+                regs   = self.regs
+                cache  = self.inst_cache
+                blocks = self.blocks and self.profile is None and \
+                                                         self.trace is None
+                start  = time.perf_counter()
+                while not self.stopped and self.steps < end:
+                        block = self.block() if blocks else None
+                        if block and block[2] <= end - self.steps:
+                                cmd, n       = block[0](regs, self.memory,
+                                                        end - self.steps)
+                                self.steps  += n
+                                self.stopped = (cmd == "stop")
+                        elif self.trace is not None:
+                                self.trace_step()
+                        elif self.profile is not None:
+                                self.profile_step()
+                        elif blocks or regs[IP_REG] not in cache:
+                                self.step()
+                        else:
+                                self.steps = self.cycles(end)
+                if self.profile is not None:
+                        self.profile.time += time.perf_counter() - start
+
+        def profile_step(self):
+                """
+                Implements profiled instruction cycles.
+
+                Records the instruction addresses, commands and register
+                argument values in the profile.  Returns instruction commands.
+                """
+
+                address = self.regs[IP_REG]
+                a, b, _ = reg_args(self.memory[address:address + WORD_SIZE])
+                a, b    = self.regs[a], self.regs[b]
+                result  = self.step()
+                self.profile.record(address, result, a, b)
+
+                return result
+
+        def trace_step(self):
+                """
+                Implements traced instruction cycles.
+
+                Appends records to the trace and takes snapshots periodically.
+                Profiles are also updated.
+                """
+
+                trace   = self.trace
+                if trace.first is None:
+                        trace.first = self.steps
+                if self.steps % trace.snap_len == 0 or not trace.snapshots:
+                        trace.snapshot(self.steps, self.checkpoint())
+                address = self.regs[IP_REG]
+                inst    = self.memory[address:address + WORD_SIZE]
+                a, b, c = reg_args(inst)
+                stored  = self.regs[a], self.regs[b]
+                cmd     = self.step() if self.profile is None else \
+                                                           self.profile_step()
+                reg     = {"copy"  : inst[3] & 0xf,
+                           "load"  : b,
+                           "zjump" : IP_REG,
+                           "gjump" : IP_REG,
+                           "stop"  : IP_REG,
+                           "store" : N_REGS}.get(cmd, c)
+                value   = stored[0] if reg == N_REGS else self.regs[reg]
+                target  = stored[1] if reg == N_REGS else 0
+                trace.append(address, int.from_bytes(inst, "big"), reg, value,
+                                                                        target)
+
+        def cycles(self, end):
+                """
+                Implements instruction cycles of decoded instructions.
+
+                Runs decoded instructions without checking the caches for them
+                first.  Stops at stop instructions, at instructions that are
+                not decoded yet or at step counts.  Returns step counts.
+                """
+
+                regs, memory, cache = self.regs, self.memory, self.inst_cache
+                result              = end
+                if end == math.inf:
+                        counts = itertools.count(self.steps)
+                else:
+                        counts = range(self.steps, end)
+                try:
+                        for result in counts:
+                                cmd, func     = cache[regs[IP_REG]]
+                                func(regs, memory)
+                                regs[IP_REG] += WORD_SIZE
+                                if cmd == "stop":
+                                        self.stopped  = True
+                                        result       += 1
+                                        break
+                        else:
+                                result = end
+                except KeyError:
+                        pass
+
+                return result
+
+        def checkpoint(self):
+                """
+                Creates checkpoints.
+
+                Checkpoints are compressed and contain image digests, memory
+                sizes, step counts, whether the computer stopped, the registers
+                and the numbers and contents of the pages that differ from the
+                loaded images.
+                """
+
+                image  = Memory(self.image, self.mem_size)
+                zeros  = bytearray(PAGE_SIZE)
+                result = HEADER.pack(hashlib.sha256(self.image).digest(),
+                                     self.mem_size,
+                                     self.steps,
+                                     self.stopped,
+                                     *self.regs)
+                for e, page in sorted(self.memory.pages.items()):
+                        if page != image.pages.get(e, zeros):
+                                result += WORD.pack(e) + page
+
+                return zlib.compress(result)
+
+        def resume(self, checkpoint):
+                """
+                Resumes from checkpoints.
+
+                The images that the checkpoints were created from must be
+                loaded.  Memory sizes are set from the checkpoints.
+                """
+
+                data                      = zlib.decompress(checkpoint)
+                digest, mem_size, *state  = HEADER.unpack_from(data)
+                if digest != hashlib.sha256(self.image).digest():
+                        raise ValueError("checkpoint is for a different image")
+                self.mem_size             = mem_size
+                self.load(self.image)
+                self.steps, self.stopped  = state[:2]
+                self.regs[:]              = state[2:]
+                for i in range(HEADER.size, len(data), WORD_SIZE + PAGE_SIZE):
+                        page                    = WORD.unpack_from(data, i)[0]
+                        start                   = i + WORD_SIZE
+                        self.memory.pages[page] = bytearray(data[start:start +
+                                                                 PAGE_SIZE])
+
+        def state(self):
+                """
+                Gets states of the computer.
+
+                Computer states are register and memory value sets.
+                """
+
+                return self.regs, self.memory
+
+def execute(memory, blocks = False, mem_size = MEM_SIZE):
+        """
+        Executes instructions in memory until a stop instruction is reached.
+
+        Register values are initially set to zero.  Returns register and memory
+        values which are also referred to as the state of the computer.
+        Instructions can be executed in translated basic blocks.  The address
+        space size can be changed.
+        """
+
+        computer = Computer(mem_size, blocks)
+        computer.load(memory)
+        computer.run()
+
+        return computer.state()
+
+def run_image(path, blocks = False, mem_size = MEM_SIZE, max_steps = None,
+                                                              timeout = None):
+        """
+        Runs machine code files.
+
+        Returns dictionaries with the paths, whether the computer stopped, step
+        counts, final register values and wall times in seconds.  Runs can be
+        limited by steps and timeouts in seconds.
+        """
+
+        start    = time.perf_counter()
+        computer = Computer(mem_size, blocks)
+        with open(path, "rb") as f:
+                computer.load(f.read())
+        computer.run(max_steps, timeout)
+        result   = {"image"     : path,
+                    "stopped"   : computer.stopped,
+                    "steps"     : computer.steps,
+                    "registers" : computer.regs,
+                    "time"      : time.perf_counter() - start}
+
+        return result
+
+def batch_image(path, **kwargs):
+        """
+        Runs machine code files in batches.
+
+        Like run_image except that errors are returned instead of raised so
+        that one faulting file does not stop the batch.  Results have error
+        messages or None.
+        """
+
+        start = time.perf_counter()
+        try:
+                result          = run_image(path, **kwargs)
+                result["error"] = None
+        except Exception as e:
+                result = {"image"     : path,
+                          "stopped"   : False,
+                          "steps"     : None,
+                          "registers" : None,
+                          "time"      : time.perf_counter() - start,
+                          "error"     : f"{type(e).__name__}: {e}"}
+
+        return result
+
+def image_paths(path):
+        """
+        Finds machine code files.
+
+        Paths can be directories of machine code files or manifests listing
+        them one per line.  Manifest paths are relative to the manifests.
+        """
+
+        if os.path.isdir(path):
+                result = [os.path.join(path, e) for e in os.listdir(path)]
+                result = sorted([e for e in result if os.path.isfile(e)])
+        else:
+                dir_   = os.path.dirname(path)
+                with open(path) as f:
+                        result = [os.path.join(dir_, e.strip()) for e in f
+                                                                if e.strip()]
+
+        return result
+
+def run_batch(paths, blocks = False, mem_size = MEM_SIZE, processes = None,
+                                             max_steps = None, timeout = None):
+        """
+        Runs batches of machine code files.
+
+        The files are run by pools of worker processes which are started once.
+        Results are yielded in the order that the files finish.  The number of
+        processes defaults to the number of cores.  Steps and timeouts limit
+        each file.  Files that fault give results with error messages.
+        """
+
+        run = functools.partial(batch_image, blocks    = blocks,
+                                             mem_size  = mem_size,
+                                             max_steps = max_steps,
+                                             timeout   = timeout)
+        with multiprocessing.Pool(processes) as pool:
+                yield from pool.imap_unordered(run, paths)
+
+def word_lines(memory, start, end):
+        """
+        Formats memory words.
+
+        Returns lines for the words between two addresses.  Words extending
+        past the end of the memory are zero padded.
+        """
+
+        hex_ = memory[start:end].hex()
+        hex_ = hex_ + (-len(hex_) % (2 * WORD_SIZE)) * "0"
+
+        return [f"\t{start + i // 2:#010x}: 0x{hex_[i:i + 2 * WORD_SIZE]}\n"
+                                  for i in range(0, len(hex_), 2 * WORD_SIZE)]
+
+def print_state(state, mode = "text", image = b""):
+        """
+        Prints states of the computer.
+
+        Computer states are register and memory value sets.  The text mode
+        prints every memory word.  The nonzero and changed modes only print
+        nonzero words and words that differ from the loaded image.  The binary
+        mode writes the memory.  The json mode prints the registers.  The none
+        mode prints nothing.  Text is written one page at a time.
+        """
+
+        regs, memory = state
+        if   mode == "none":
+                pass
+        elif mode == "binary":
+                sys.stdout.buffer.write(bytes(memory))
+        elif mode == "json":
+                print(json.dumps({"registers" : regs}, separators = (",", ":")))
+        else:
+                text  = "registers:\n\n"
+                text += "".join([f"\t{i:02}: {e:#010x}\n"
+                                                  for i, e in enumerate(regs)])
+                text += "\nmemory:\n\n"
+                sys.stdout.write(text)
+                if mode == "text":
+                        pages = range(0, len(memory), PAGE_SIZE)
+                else:
+                        pages = [PAGE_SIZE * e for e in sorted(memory.pages)]
+                        image = Memory(image, len(memory))
+                for start in pages:
+                        end   = min(start + PAGE_SIZE, len(memory))
+                        lines = word_lines(memory, start, end)
+                        if   mode == "nonzero":
+                                zero  = f": 0x{2 * WORD_SIZE * '0'}\n"
+                                lines = [e for e in lines
+                                                   if not e.endswith(zero)]
+                        elif mode == "changed":
+                                old   = word_lines(image, start, end)
+                                lines = [e for e, f in zip(lines, old)
+                                                                   if e != f]
+                        sys.stdout.write("".join(lines))
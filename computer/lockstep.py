@@ -0,0 +1,216 @@
+"""
+Copyright 2025 Christian Seberino
+
+This file is part of Pylayers.
+
+Pylayers is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+Pylayers is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+Pylayers. If not, see <https://www.gnu.org/licenses/>.
+
+________________________________________________________________________________
+
+
+Contains the lockstep computer.
+
+Runs many instances of the computer at once.  Typically the instances run the
+same program on different initial memories.  The registers of all the
+instances are stored in one NumPy array with one row per instance.  The
+memories are stored in another NumPy array of big endian words with one row
+per instance.  Instances with the same instruction pointer values and the same
+instructions are executed together with NumPy array operations.  Instances
+whose instruction pointers diverge after jumps are executed separately by
+masking.  The results are the same as running the instances on the computer one
+at a time.  Requires NumPy.
+"""
+
+import numpy
+import comp
+
+WORD_SIZE = comp.WORD_SIZE
+IP_REG    = comp.IP_REG
+ALF_FUNCS = {"add"  : numpy.add,
+             "sub"  : numpy.subtract,
+             "mul"  : numpy.multiply,
+             "and_" : numpy.bitwise_and,
+             "or_"  : numpy.bitwise_or}
+
+def decode(inst):
+        """
+        Decodes instructions.
+
+        Instructions are given as integers.  Returns commands, register numbers
+        and copy data.
+        """
+
+        inst  = inst.to_bytes(WORD_SIZE, "big")
+        cmd   = comp.CMDS[inst[0] >> comp.NIBB_BITS]
+        regs  = comp.reg_args(inst)
+        datum = (int.from_bytes(inst, "big") & 0x0ffffff0) >> comp.NIBB_BITS
+        if cmd == "copy":
+                regs = (inst[3] & 0xf, 0, 0)
+
+        return cmd, regs, datum
+
+class Lockstep:
+        """
+        Implements the lockstep computer.
+
+        Instances are created from machine code images which are copied into
+        their memories beginning at address zero.  Memory words that are not
+        aligned or that extend past the end of the memories are accessed one
+        instance at a time.
+        """
+
+        def __init__(self, images, mem_size = comp.MEM_SIZE):
+                n_words       = -(-mem_size // WORD_SIZE)
+                self.mem_size = mem_size
+                self.regs     = numpy.zeros((len(images), comp.N_REGS),
+                                            numpy.uint32)
+                self.memory   = numpy.zeros((len(images), n_words), ">u4")
+                self.bytes    = self.memory.view(numpy.uint8)[:, :mem_size]
+                self.steps    = numpy.zeros(len(images), numpy.int64)
+                self.stopped  = numpy.zeros(len(images), bool)
+                self.cache    = {}
+                for i, image in enumerate(images):
+                        image                      = bytes(image[:mem_size])
+                        self.bytes[i, :len(image)] = numpy.frombuffer(image,
+                                                                  numpy.uint8)
+
+        def aligned(self, addresses):
+                """
+                Finds aligned memory words.
+
+                Returns masks of the addresses of words that are aligned and
+                entirely within the memories.
+                """
+
+                return (addresses % WORD_SIZE == 0) & \
+                                     (addresses <= self.mem_size - WORD_SIZE)
+
+        def load(self, rows, addresses):
+                """
+                Reads memory words.
+
+                Reads one word per instance.  Words extending past the end of
+                the memories are made from the bytes in them.
+                """
+
+                aligned         = self.aligned(addresses)
+                result          = numpy.zeros(len(rows), numpy.uint32)
+                result[aligned] = self.memory[rows[aligned],
+                                              addresses[aligned] // WORD_SIZE]
+                for i in numpy.flatnonzero(~aligned):
+                        start     = int(addresses[i])
+                        word      = self.bytes[rows[i], start:start + WORD_SIZE]
+                        result[i] = int.from_bytes(word.tobytes(), "big")
+
+                return result
+
+        def store(self, rows, addresses, words):
+                """
+                Writes memory words.
+
+                Writes one word per instance.  Bytes past the end of the
+                memories are not written.
+                """
+
+                aligned = self.aligned(addresses)
+                self.memory[rows[aligned], addresses[aligned] // WORD_SIZE] = \
+                                                                 words[aligned]
+                for i in numpy.flatnonzero(~aligned):
+                        start   = int(addresses[i])
+                        word    = int(words[i]).to_bytes(WORD_SIZE, "big")
+                        data    = self.bytes[rows[i], start:start + WORD_SIZE]
+                        data[:] = numpy.frombuffer(word[:len(data)],
+                                                   numpy.uint8)
+
+        def execute(self, inst, rows):
+                """
+                Executes instructions.
+
+                Executes one instruction for the instances in rows.  Division
+                by zero gives zero.  Arithmetic wraps around at 2^32.
+                """
+
+                if inst not in self.cache:
+                        self.cache[inst] = decode(inst)
+                cmd, (a, b, c), datum = self.cache[inst]
+                regs                  = self.regs
+                if   cmd in ALF_FUNCS:
+                        regs[rows, c] = ALF_FUNCS[cmd](regs[rows, a],
+                                                       regs[rows, b])
+                elif cmd == "div":
+                        x, y          = regs[rows, a], regs[rows, b]
+                        regs[rows, c] = numpy.floor_divide(x, y, where = y != 0,
+                                                   out = numpy.zeros_like(x))
+                elif cmd == "zjump":
+                        jump               = rows[regs[rows, a] == 0]
+                        regs[jump, IP_REG] = regs[jump, b] - WORD_SIZE
+                elif cmd == "gjump":
+                        jump               = rows[regs[rows, a] > regs[rows, b]]
+                        regs[jump, IP_REG] = regs[jump, c] - WORD_SIZE
+                elif cmd == "copy":
+                        regs[rows, a] = datum
+                elif cmd == "load":
+                        regs[rows, b] = self.load(rows, regs[rows, a])
+                elif cmd == "store":
+                        self.store(rows, regs[rows, b], regs[rows, a])
+                else:
+                        self.stopped[rows] = True
+
+        def step(self):
+                """
+                Implements instruction cycles.
+
+                Every instance that has not stopped executes one instruction.
+                Instances are grouped by instruction pointer values and
+                instructions.  Returns whether all instances stopped.
+                """
+
+                active = numpy.flatnonzero(~self.stopped)
+                ips    = self.regs[active, IP_REG]
+                for ip in numpy.unique(ips):
+                        rows  = active[ips == ip]
+                        insts = self.load(rows, numpy.full(len(rows), ip))
+                        for inst in numpy.unique(insts):
+                                self.execute(int(inst), rows[insts == inst])
+                self.regs[active, IP_REG] += WORD_SIZE
+                self.steps[active]        += 1
+
+                return bool(self.stopped.all())
+
+        def run(self, max_steps = None):
+                """
+                Runs the lockstep computer.
+
+                Executes instructions until all instances stop or the maximum
+                number of steps is executed.  Returns whether all instances
+                stopped.
+                """
+
+                result = bool(self.stopped.all())
+                steps  = 0
+                while not result and (max_steps is None or steps < max_steps):
+                        result  = self.step()
+                        steps  += 1
+
+                return result
+
+        def state(self, i):
+                """
+                Gets states of instances.
+
+                Returns register value lists and memories.
+                """
+
+                memory = comp.Memory(self.bytes[i].tobytes(), self.mem_size)
+
+                return self.regs[i].tolist(), memory
@@ -22,21 +22,24 @@ ________________________________________________________________________________
 
 Contains the unit tests.
 
-Tests the computer.
+Tests the computer.  The lockstep computer tests require NumPy which is listed
+in requirements.txt.
 """
 
+import sys
+sys.path.append("..")
+
+import comp
 import unittest
 import subprocess
+import json
+import io
 import os
 
-subprocess.call(["cp", "../computer", "comp.py"])
-with open("comp.py") as f:
-        comp = f.readlines()
-        comp = "".join(comp[:89] + comp[89 + 4:-4])
-with open("comp.py", "w") as f:
-        f.write(comp)
-import comp
-os.remove("comp.py")
+try:
+        import lockstep
+except ImportError:
+        lockstep = None
 
 def pad_mem_str(n_lines_skip):
         offsets = range(4 * n_lines_skip, 2 ** 20, 4)
@@ -46,7 +49,8 @@ def pad_mem_str(n_lines_skip):
 def pad_mem_bin(bytearray_):
         return bytearray_ + bytearray((2 ** 20 - len(bytearray_)) * b"\x00")
 
-def final_comp_state(asm):
+def final_comp_state(asm, opts = None):
+        opts = [] if opts is None else opts
         with open("__asm__", "w") as f:
                 f.write(asm)
         mach_code = subprocess.check_output(["../../asm_to_mach/asm_to_mach",
@@ -54,11 +58,14 @@ def final_comp_state(asm):
         os.remove("__asm__")
         with open("__memory__", "wb") as f:
                 f.write(mach_code)
-        final_comp_state_ = subprocess.check_output(["../computer",
-                                                     "__memory__"])
+        final_comp_state_ = subprocess.check_output(["../computer"] + opts +
+                                                    ["__memory__"])
         os.remove("__memory__")
 
-        return final_comp_state_.decode()
+        if "--output=binary" not in opts:
+                final_comp_state_ = final_comp_state_.decode()
+
+        return final_comp_state_
 
 class Tester(unittest.TestCase):
         def test_reg_args(self):
@@ -174,30 +181,30 @@ class Tester(unittest.TestCase):
                 self.assertEqual(output, answer)
 
         def test_load(self):
-                comp.memory = pad_mem_bin(bytearray.fromhex("aabbccddeeff"))
+                comp.memory = comp.Memory(bytes.fromhex("aabbccddeeff"))
                 comp.regs   = list(range(1, 17))
                 comp.load(bytes.fromhex("01300000"), comp.regs, comp.memory)
-                output      = comp.regs, comp.memory
+                output      = comp.regs, bytes(comp.memory)
                 answer      = list(range(1, 17))
                 answer[3]   = 0xccddeeff
                 answer      = (answer,
                     pad_mem_bin(bytes.fromhex("aabbccddeeff")))
                 self.assertEqual(output, answer)
 
-                comp.memory = pad_mem_bin(bytearray.fromhex("aabbccddeeff"))
+                comp.memory = comp.Memory(bytes.fromhex("aabbccddeeff"))
                 comp.regs   = list(range(1, 17))
                 comp.load(bytes.fromhex("03900000"), comp.regs, comp.memory)
-                output      = comp.regs, comp.memory
+                output      = comp.regs, bytes(comp.memory)
                 answer      = list(range(1, 17))
                 answer[9]   = 0xeeff0000
                 answer      = (answer,
                     pad_mem_bin(bytes.fromhex("aabbccddeeff0000")))
                 self.assertEqual(output, answer)
 
-                comp.memory = pad_mem_bin(bytearray.fromhex("aabbccddeeff"))
+                comp.memory = comp.Memory(bytes.fromhex("aabbccddeeff"))
                 comp.regs   = list(range(1, 17))
                 comp.load(bytes.fromhex("06900000"), comp.regs, comp.memory)
-                output      = comp.regs, comp.memory
+                output      = comp.regs, bytes(comp.memory)
                 answer      = list(range(1, 17))
                 answer[9]   = 0x00000000
                 answer      = (answer,
@@ -205,39 +212,73 @@ class Tester(unittest.TestCase):
                 self.assertEqual(output, answer)
 
         def test_store(self):
-                comp.memory   = pad_mem_bin(bytearray.fromhex("aabbccddeeff"))
+                comp.memory   = comp.Memory(bytes.fromhex("aabbccddeeff"))
                 comp.regs     = list(range(1, 17))
                 comp.regs[11] = 0xdeadbeef
                 comp.store(bytes.fromhex("0b100000"), comp.regs, comp.memory)
-                output        = comp.regs, comp.memory
+                output        = comp.regs, bytes(comp.memory)
                 answer        = list(range(1, 17))
                 answer[11]    = 0xdeadbeef
                 answer        = (answer,
                     pad_mem_bin(bytes.fromhex("aabbdeadbeef")))
                 self.assertEqual(output, answer)
 
-                comp.memory   = pad_mem_bin(bytearray.fromhex("aabbccddeeff"))
+                comp.memory   = comp.Memory(bytes.fromhex("aabbccddeeff"))
                 comp.regs     = list(range(1, 17))
                 comp.regs[11] = 0xdeadbeef
                 comp.store(bytes.fromhex("0b300000"), comp.regs, comp.memory)
-                output        = comp.regs, comp.memory
+                output        = comp.regs, bytes(comp.memory)
                 answer        = list(range(1, 17))
                 answer[11]    = 0xdeadbeef
                 answer        = (answer,
                     pad_mem_bin(bytes.fromhex("aabbccdddeadbeef")))
                 self.assertEqual(output, answer)
 
-                comp.memory   = pad_mem_bin(bytearray.fromhex("aabbccddeeff"))
+                comp.memory   = comp.Memory(bytes.fromhex("aabbccddeeff"))
                 comp.regs     = list(range(1, 17))
                 comp.regs[11] = 0xdeadbeef
                 comp.store(bytes.fromhex("0b600000"), comp.regs, comp.memory)
-                output        = comp.regs, comp.memory
+                output        = comp.regs, bytes(comp.memory)
                 answer        = list(range(1, 17))
                 answer[11]    = 0xdeadbeef
                 answer        = (answer,
                     pad_mem_bin(bytes.fromhex("aabbccddeeff00deadbeef")))
                 self.assertEqual(output, answer)
 
+        def test_memory(self):
+                image = bytes.fromhex("aabbccddeeff00112233")
+                for address in range(0, 12):
+                        memory = comp.Memory(image, 10)
+                        output = memory.load_word(address)
+                        answer = int.from_bytes(image[address:address + 4],
+                                                "big")
+                        self.assertEqual(output, answer)
+
+                        memory.store_word(address, 0xdeadbeef)
+                        output = bytes(memory)
+                        answer = bytearray(image)
+                        answer[address:address + 4] = bytes.fromhex("deadbeef")
+                        self.assertEqual(output, bytes(answer[:10]))
+
+                size   = 3 * comp.PAGE_SIZE
+                memory = comp.Memory(image, size)
+                memory.store_word(comp.PAGE_SIZE - 2, 0xdeadbeef)
+                memory.store_word(size - 8, 0x12345678)
+                output = sorted(memory.pages), len(memory), bytes(memory)
+                answer = bytearray(size)
+                answer[:10] = image
+                answer[comp.PAGE_SIZE - 2:comp.PAGE_SIZE + 2] = \
+                                                      bytes.fromhex("deadbeef")
+                answer[size - 8:size - 4] = bytes.fromhex("12345678")
+                answer = [0, 1, 2], size, bytes(answer)
+                self.assertEqual(output, answer)
+                output = memory.load_word(comp.PAGE_SIZE - 2)
+                self.assertEqual(output, 0xdeadbeef)
+                output = memory.load_word(comp.PAGE_SIZE + 8)
+                self.assertEqual(output, 0)
+                output = comp.Memory(image, 2 ** 32)
+                self.assertEqual(output.load_word(2 ** 31), 0)
+
         def test_stop(self):
                 comp.regs = list(range(1, 17))
                 comp.stop(bytes.fromhex("0b100000"), comp.regs, None)
@@ -245,6 +286,478 @@ class Tester(unittest.TestCase):
                 answer    = list(range(1, 17))
                 self.assertEqual(output, answer)
 
+        def test_decode(self):
+                written       = []
+                comp.memory   = comp.Memory(bytes.fromhex("aabbccddeeff"))
+                comp.regs     = list(range(1, 17))
+                comp.regs[11] = 0xdeadbeef
+                for inst in ["095f0000", "64300000", "73450000", "8eadbeef",
+                             "93900000", "ab300000", "b0000000"]:
+                        regs   = list(comp.regs)
+                        memory = comp.Memory(bytes(comp.memory))
+                        cmd    = comp.CMDS[int(inst[0], 16)]
+                        getattr(comp, cmd)(bytes.fromhex(inst), regs, memory)
+                        answer = regs, bytes(memory)
+                        regs   = list(comp.regs)
+                        memory = comp.Memory(bytes(comp.memory))
+                        output = comp.decode(bytes.fromhex(inst),
+                                             written.append)
+                        output[1](regs, memory)
+                        output = regs, bytes(memory)
+                        self.assertEqual(output, answer)
+
+                output = written
+                answer = [comp.regs[3]]
+                self.assertEqual(output, answer)
+
+        def test_computer(self):
+                image    = bytes.fromhex("8000064180000012800000c4"
+                                         "1121000071340000b0000000")
+                computer = comp.Computer()
+                computer.load(image)
+                output   = [computer.step(), computer.step()]
+                answer   = ["copy", "copy"]
+                self.assertEqual(output, answer)
+                self.assertFalse(computer.run(100))
+                self.assertEqual(computer.steps, 102)
+                self.assertTrue(computer.run())
+                self.assertEqual(computer.steps, 204)
+                regs, memory = computer.state()
+                self.assertEqual(regs[1], 0)
+
+                computer = comp.Computer(blocks = True)
+                computer.load(image)
+                for max_steps, steps in [(1, 1), (3, 4), (7, 11), (50, 61)]:
+                        self.assertFalse(computer.run(max_steps))
+                        self.assertEqual(computer.steps, steps)
+                self.assertTrue(computer.run())
+                self.assertEqual(computer.steps, 204)
+                output   = computer.state()
+                output   = output[0], bytes(output[1])
+                answer   = regs, bytes(memory)
+                self.assertEqual(output, answer)
+
+        def test_checkpoint(self):
+                image    = bytes.fromhex("8000064180000012800000c4"
+                                         "1121000080020005a1500000"
+                                         "71340000b0000000")
+                computer = comp.Computer(blocks = True)
+                computer.load(image)
+                computer.run()
+                answer   = computer.steps, computer.regs, bytes(computer.memory)
+
+                computer = comp.Computer()
+                computer.load(image)
+                self.assertFalse(computer.run(timeout = 0))
+                self.assertEqual(computer.steps, 0)
+                self.assertFalse(computer.run(50, 60))
+                self.assertEqual(computer.steps, 50)
+                checkpoint = computer.checkpoint()
+                self.assertLess(len(checkpoint), 256)
+                with self.assertRaises(ValueError):
+                        comp.Computer().resume(checkpoint)
+
+                computer = comp.Computer(blocks = True)
+                computer.load(image)
+                computer.resume(checkpoint)
+                self.assertEqual(computer.steps, 50)
+                self.assertTrue(computer.run())
+                output   = computer.steps, computer.regs, bytes(computer.memory)
+                self.assertEqual(output, answer)
+
+        def test_trace(self):
+                image    = bytes.fromhex("8000064180000012800000c4"
+                                         "1121000080020005a1500000"
+                                         "71340000b0000000")
+                computer = comp.Computer()
+                computer.load(image)
+                answers  = []
+                while not computer.stopped:
+                        answers.append((list(computer.regs),
+                                        bytes(computer.memory)))
+                        computer.step()
+                answers.append((list(computer.regs), bytes(computer.memory)))
+
+                ring     = comp.Trace(size = 100, snap_len = 64)
+                for trace in [comp.Trace(snap_len = 64), ring,
+                              comp.Trace(io.BytesIO())]:
+                        computer = comp.Computer(trace = trace)
+                        computer.load(image)
+                        computer.run()
+                        self.assertEqual(trace.count, len(answers) - 1)
+                        for step in [0, 1, 63, 64, 200, 390, len(answers) - 1]:
+                                if step < trace.count - 100 and trace.size:
+                                        continue
+                                output = comp.replay(image, trace, step)
+                                output = output.regs, bytes(output.memory)
+                                self.assertEqual(output, answers[step])
+                with self.assertRaises(ValueError):
+                        comp.replay(image, ring, 10)
+                for snap_len in [1, 7, 64, comp.SNAP_LEN]:
+                        trace    = comp.Trace(size = 50, snap_len = snap_len)
+                        computer = comp.Computer(trace = trace)
+                        computer.load(image)
+                        computer.run()
+                        self.assertLessEqual(len(trace.snapshots),
+                                             comp.MAX_SNAPS + 2)
+                        for step in range(trace.count - 50, trace.count + 1):
+                                output = comp.replay(image, trace, step)
+                                output = output.regs, bytes(output.memory)
+                                self.assertEqual(output, answers[step])
+
+                image    = bytes.fromhex("80001001a0100000"
+                                         "80000072a2000000b0000000")
+                for args in [[], ["--replay=__trace__"],
+                             ["--replay=__trace__", "--replay-step=2"]]:
+                        with open("__image__", "wb") as f:
+                                f.write(image)
+                        trace  = [] if args else ["--trace=__trace__"]
+                        output = subprocess.check_output(["../computer",
+                                                          "--output=binary"] +
+                                                         trace + args +
+                                                         ["__image__"])
+                        answer = bytearray(image + bytes(2 ** 20 - 20))
+                        answer[0x0c:0x10] = bytes.fromhex("00000007")
+                        if args[1:]:
+                                answer[0x0c:0x10] = image[0x0c:0x10]
+                        answer[0x100:0x104] = bytes.fromhex("00000004")
+                        self.assertEqual(output, answer)
+                output   = subprocess.check_output(["../computer", "--replay=x",
+                                                    "--blocks", "__image__"])
+                self.assertTrue(output.startswith(b"Usage:"))
+                os.remove("__image__")
+                os.remove("__trace__")
+
+                image    = bytes.fromhex("8000064180000012800000c4"
+                                         "1121000071340000b0000000")
+                trace    = comp.Trace(snap_len = 1)
+                computer = comp.Computer(trace = trace)
+                computer.load(image)
+                computer.run()
+                self.assertLessEqual(len(trace.snapshots), comp.MAX_SNAPS)
+                for step in [0, 1, 100, trace.count]:
+                        output   = comp.replay(image, trace, step)
+                        computer = comp.Computer()
+                        computer.load(image)
+                        computer.run(step)
+                        self.assertEqual(output.regs, computer.regs)
+
+        def test_printer(self):
+                asm    = \
+"""
+              copy  PRINTER_DATA r1
+              load  r1           r1
+              copy  0x48         r2
+              store r2           r1
+              copy  0x169        r2
+              store r2           r1
+              copy  0x0a         r2
+              store r2           r1
+              stop
+PRINTER_DATA: 0x00fffffc
+"""
+                for opts in [[], ["--blocks"], ["--mem-size=33554432"]]:
+                        output = final_comp_state(asm, opts + ["--printer",
+                                                               "--output=none"])
+                        self.assertEqual(output, "Hi\n")
+
+                stream  = io.BytesIO()
+                printer = comp.Printer(stream, 2)
+                for e in b"abc":
+                        printer.print_(e)
+                self.assertEqual(stream.getvalue(), b"ab")
+                printer.flush()
+                self.assertEqual(stream.getvalue(), b"abc")
+
+        def test_profile(self):
+                image    = bytes.fromhex("8000064180000012800000c4"
+                                         "1121000071340000"
+                                         "a2400000b0000000")
+                computer = comp.Computer(256, True, True)
+                computer.load(image)
+                computer.run()
+                profile  = computer.profile
+                output   = json.loads(profile.json())
+                self.assertEqual(output["steps"], 205)
+                self.assertEqual(output["cmds"]["sub"], 100)
+                self.assertEqual(output["cmds"]["mul"], 0)
+                self.assertEqual(output["addresses"]["0x0000000c"], 100)
+                answer   = {"taken" : 99, "not_taken" : 1, "ratio" : 0.99}
+                self.assertEqual(output["jumps"]["gjump"], answer)
+                self.assertEqual(output["stores"], {"0x0000000c" : 1})
+                output   = profile.listing(comp.Memory(image), {"loop" : 12})
+                output   = output.split("\n")[3].split()
+                answer   = ["0x0000000c:", "0x11210000", "loop:", "sub", "100",
+                            "48.78%"]
+                self.assertEqual(output, answer)
+
+        @unittest.skipIf(lockstep is None, "NumPy is not installed")
+        def test_lockstep(self):
+                asm    = \
+"""
+       copy  data  r1
+       load  r1    r2
+       copy  7     r3
+       div   r2 r3 r4
+       div   r2 r5 r6
+       mul   r2 r2 r7
+       sub   r8 r2 r9
+       copy  zero  r10
+       zjump r2    r10
+       copy  15    r11
+       and   r2 r11 r11
+       or    r11 r3 r12
+       copy  loop  r10
+       copy  1     r15
+loop:  sub   r11 r15 r11
+       add   r13 r3  r13
+       gjump r11 r5  r10
+       store r13 r1
+       stop
+zero:  copy  5     r15
+       store r15   r1
+       stop
+data:  0x0
+"""
+                with open("__asm__", "w") as f:
+                        f.write(asm)
+                image  = subprocess.check_output(
+                                 ["../../asm_to_mach/asm_to_mach", "__asm__"])
+                os.remove("__asm__")
+                images = [image[:-4] + e.to_bytes(4, "big") for e in
+                                      [0, 1, 5, 20, 0xfffffff3, 0x12345678]]
+                lockstep_ = lockstep.Lockstep(images, 256)
+                self.assertFalse(lockstep_.run(10))
+                self.assertTrue(lockstep_.run())
+                for i, e in enumerate(images):
+                        computer = comp.Computer(256)
+                        computer.load(e)
+                        computer.run()
+                        output   = lockstep_.state(i)
+                        output   = output[0], bytes(output[1])
+                        answer   = computer.state()
+                        answer   = answer[0], bytes(answer[1])
+                        self.assertEqual(output, answer)
+                        self.assertEqual(lockstep_.steps[i], computer.steps)
+
+                programs = ["       copy  new   r2\n"
+                            "       load  r2    r3\n"
+                            "       copy  patch r4\n"
+                            "       store r3    r4\n"
+                            "patch: copy  1     r5\n"
+                            "       copy  jump  r0\n"
+                            "jump:  copy  2     r6\n"
+                            "       copy  3     r6\n"
+                            "       stop\n"
+                            "new:   copy  7     r5\n",
+                            "       copy  0x3e  r1\n"
+                            "       copy  0xab  r2\n"
+                            "       store r2    r1\n"
+                            "       load  r1    r3\n"
+                            "       copy  0xfe  r4\n"
+                            "       load  r4    r5\n"
+                            "       stop\n"]
+                for program in programs:
+                        with open("__asm__", "w") as f:
+                                f.write(program)
+                        image     = subprocess.check_output(
+                                         ["../../asm_to_mach/asm_to_mach",
+                                          "__asm__"])
+                        os.remove("__asm__")
+                        lockstep_ = lockstep.Lockstep([image, image], 256)
+                        self.assertTrue(lockstep_.run())
+                        computer  = comp.Computer(256)
+                        computer.load(image)
+                        computer.run()
+                        output    = lockstep_.state(1)
+                        output    = output[0], bytes(output[1])
+                        answer    = computer.state()
+                        answer    = answer[0], bytes(answer[1])
+                        self.assertEqual(output, answer)
+
+        def test_self_modifying_code(self):
+                asm    = \
+"""
+       copy  1     r1
+       copy  new   r2
+       load  r2    r3
+       copy  patch r4
+       copy  patch r6
+       copy  2     r9
+patch: add   r1 r1 r5
+       store r3 r4
+       add   r7 r1 r7
+       gjump r9 r7 r6
+       stop
+new:   copy  7     r5
+"""
+                output = final_comp_state(asm)
+                self.assertIn("\t05: 0x00000007\n", output)
+                self.assertIn("\t07: 0x00000002\n", output)
+
+        def test_invalidate(self):
+                computer = comp.Computer()
+                computer.load(bytes(8))
+                end      = comp.PAGE_SIZE
+                for address, answer in [(12, True), (2, False),
+                                        (end, True), (end - 3, True)]:
+                        for e in [4, end - 2]:
+                                computer.inst_cache[e] = None
+                                computer.code[e:e + 4] = 4 * b"\x01"
+                        computer.invalidate(address)
+                        output = 4 in computer.inst_cache
+                        self.assertEqual(output, answer)
+                        output = end - 2 in computer.inst_cache
+                        self.assertEqual(output, address < end - 5)
+
+        def test_blocks(self):
+                asm    = \
+"""
+       copy  new   r2
+       load  r2    r3
+       copy  patch r4
+       store r3    r4
+patch: copy  1     r5
+       copy  jump  r0
+jump:  copy  2     r6
+       copy  3     r6
+       copy  3     r1
+       copy  1     r2
+       copy  loop  r4
+       copy  done  r10
+loop:  sub   r1 r2 r1
+       add   r6 r6 r6
+       zjump r1 r10
+       gjump r1 r11 r4
+done:  stop
+new:   copy  7     r5
+"""
+                output = final_comp_state(asm, ["--blocks"])
+                answer = final_comp_state(asm)
+                self.assertEqual(output, answer)
+                self.assertIn("\t05: 0x00000007\n", output)
+                self.assertIn("\t06: 0x00000018\n", output)
+
+        def test_mem_size(self):
+                asm    = \
+"""
+      copy  data r1
+      load  r1   r2
+      copy  8    r3
+      store r2   r3
+      stop
+data: 0xdeadbeef
+"""
+                output = final_comp_state(asm, ["--mem-size=32"])
+                output = output[output.find("memory:"):]
+                answer = \
+"""
+memory:
+
+	0x00000000: 0x80000141
+	0x00000004: 0x91200000
+	0x00000008: 0xdeadbeef
+	0x0000000c: 0xa2300000
+	0x00000010: 0xb0000000
+	0x00000014: 0xdeadbeef
+	0x00000018: 0x00000000
+	0x0000001c: 0x00000000
+""".lstrip()
+                self.assertEqual(output, answer)
+
+        def test_outputs(self):
+                asm    = \
+"""
+      copy  data r1
+      load  r1   r2
+      copy  0x20 r3
+      store r2   r3
+      copy  0    r4
+      store r4   r1
+      stop
+data: 0xdeadbeef
+"""
+                output = final_comp_state(asm, ["--output=nonzero"])
+                output = output[output.find("memory:"):]
+                answer = \
+"""
+memory:
+
+	0x00000000: 0x800001c1
+	0x00000004: 0x91200000
+	0x00000008: 0x80000203
+	0x0000000c: 0xa2300000
+	0x00000010: 0x80000004
+	0x00000014: 0xa4100000
+	0x00000018: 0xb0000000
+	0x00000020: 0xdeadbeef
+""".lstrip()
+                self.assertEqual(output, answer)
+
+                output = final_comp_state(asm, ["--output=changed"])
+                output = output[output.find("memory:"):]
+                answer = \
+"""
+memory:
+
+	0x0000001c: 0x00000000
+	0x00000020: 0xdeadbeef
+""".lstrip()
+                self.assertEqual(output, answer)
+
+                output = final_comp_state(asm, ["--output=json"])
+                answer = '{"registers":[28,28,3735928559,32,0,0,0,0,0,0,0,0,' \
+                                                        '0,0,0,0]}\n'
+                self.assertEqual(output, answer)
+
+                output = final_comp_state(asm, ["--output=binary",
+                                                "--mem-size=40"])
+                answer = bytes.fromhex("800001c1 91200000 80000203 a2300000"
+                                       "80000004 a4100000 b0000000 00000000"
+                                       "deadbeef 00000000")
+                self.assertEqual(output, answer)
+
+        def test_batch(self):
+                images = {"a" : "800002a1b0000000",
+                          "b" : "8000064180000012800000c4"
+                                "1121000071340000b0000000",
+                          "c" : "800002a1f0000000"}
+                os.mkdir("__batch__")
+                for name, image in images.items():
+                        with open(os.path.join("__batch__", name), "wb") as f:
+                                f.write(bytes.fromhex(image))
+                with open("__manifest__", "w") as f:
+                        f.write("__batch__/c\n__batch__/b\n\n__batch__/a\n")
+                spawn  = ["python3", "-c",
+                          "import multiprocessing, runpy, sys\n"
+                          "multiprocessing.set_start_method('spawn')\n"
+                          "sys.argv = sys.argv[1:]\n"
+                          "sys.path.insert(0, '..')\n"
+                          "runpy.run_path('../batch', run_name = '__main__')",
+                          "../batch"]
+                for args in [["__batch__"], ["--blocks", "__manifest__"]]:
+                        output = subprocess.check_output(["../batch"] + args)
+                        spawn_ = subprocess.check_output(spawn + args,
+                                                         timeout = 60)
+                        output = [json.loads(e) for e in output.splitlines()]
+                        spawn_ = [json.loads(e) for e in spawn_.splitlines()]
+                        for e in output + spawn_:
+                                del e["time"]
+                        self.assertCountEqual(spawn_, output)
+                        errors = {os.path.basename(e["image"]) : e["error"]
+                                                              for e in output}
+                        output = {os.path.basename(e["image"]) :
+                                       (e["steps"], e["registers"][1])
+                                       for e in output if not e["error"]}
+                        answer = {"a" : (2, 0x2a), "b" : (204, 0)}
+                        self.assertEqual(output, answer)
+                        self.assertEqual(errors["a"], None)
+                        self.assertIn("IndexError", errors["c"])
+                os.remove("__manifest__")
+                for name in images:
+                        os.remove(os.path.join("__batch__", name))
+                os.rmdir("__batch__")
+
         def test_lots_1(self):
                 asm    = \
 """
@@ -58,12 +58,20 @@ def encode_exp(exp):
 
         return exp_
 
-def asm_code_gen(int_code):
-        asm_code  = header.HEADER
-        asm_code += "first_exp: "
+def runtime():
+        return header.HEADER + env.ENV + footer.FOOTER
+
+def program(int_code):
+        asm_code  = "first_exp: "
         for e in exps.exps(int_code):
                 asm_code += encode_exp(e)
         asm_code += "\t0x00000000\n"
+
+        return asm_code
+
+def asm_code_gen(int_code):
+        asm_code  = header.HEADER
+        asm_code += program(int_code)
         asm_code += env.ENV
         asm_code += footer.FOOTER
 
@@ -18,17 +18,82 @@ Pylayers. If not, see <https://www.gnu.org/licenses/>.
 ________________________________________________________________________________
 
 
+
 Contains the exps function which converts intermediate code to expressions.
 
-There are no evaluated functions and macros before evaluation.
+There are no evaluated functions and macros before evaluation.  Intermediate
+code is scanned once from beginning to end.  Files can be read in chunks and
+expressions are generated as soon as they are complete.  Therefore, large
+files do not need to be read into memory all at once.
 """
 
+import itertools
 import re
 
-IGNORE_RE = r"(\s|#[^\n]*\n)*"
-TOKEN_RE  = r'\(|\)|"[^"]*"|[^"\(\)\s]+'
-BOOL_RE   = r"True|False"
-INT_RE    = r"\-?\d+"
+IGNORE_RE  = re.compile(r"(\s|#[^\n]*\n)*")
+TOKEN_RE   = re.compile(r'\(|\)|"[^"]*"|[^"\(\)\s]+')
+BOOL_RE    = re.compile(r"True|False")
+INT_RE     = re.compile(r"\-?\d+")
+CHUNK_SIZE = 2 ** 16
+
+def gen_tokens(chunks):
+        """
+        Generates tokens from chunks of intermediate code.
+
+        Tokens are expressions or parts of expressions.  Tokens and comments
+        reaching the ends of chunks are only generated after the next chunks
+        are added.
+        """
+
+        int_code = ""
+        index    = 0
+        for chunk in itertools.chain(chunks, [None]):
+                end      = chunk is None
+                int_code = int_code[index:] + ("" if end else chunk)
+                index    = 0
+                while index < len(int_code):
+                        ignore = IGNORE_RE.match(int_code, index).end()
+                        token  = TOKEN_RE.match(int_code, ignore)
+                        if not end and ((not token)                      or
+                                        (token.end() == len(int_code))   or
+                                        (int_code[ignore] == "#")):
+                                break
+                        if end and not token and ignore < len(int_code):
+                                raise SyntaxError("unterminated string")
+                        index = token.end() if token else ignore
+                        if token:
+                                yield token.group(0)
+
+def gen_exps(tokens):
+        """
+        Generates abstract syntax trees from tokens.
+
+        Abstract syntax trees are generated as soon as their last tokens are
+        read.  Variable representations use tuples.  Unfinished lists are kept
+        on a stack.
+        """
+
+        stack = []
+        for token in tokens:
+                if   token == "(":
+                        stack.append([])
+                        continue
+                elif token == ")" and stack:
+                        exp = stack.pop()
+                elif BOOL_RE.fullmatch(token):
+                        exp = True if token == "True" else False
+                elif INT_RE.fullmatch(token):
+                        exp = int(token)
+                elif token[0] == token[-1] == '"':
+                        exp = token[1:-1]
+                else:
+                        exp = (token,)
+                if stack:
+                        stack[-1].append(exp)
+                else:
+                        yield exp
+        if stack:
+                raise SyntaxError("unfinished list")
 
 def tokenizer(int_code):
         """
@@ -37,16 +102,7 @@ def tokenizer(int_code):
         Tokens are expressions or parts of expressions.
         """
 
-        tokens = []
-        index  = 0
-        while index < len(int_code):
-                index += len(re.match(IGNORE_RE, int_code[index:]).group(0))
-                token  = re.match(TOKEN_RE, int_code[index:])
-                if token:
-                        tokens.append(token.group(0))
-                        index += len(token.group(0))
-
-        return tokens
+        return list(gen_tokens([int_code]))
 
 def parser(tokens):
         """
@@ -56,30 +112,16 @@ def parser(tokens):
         representations use tuples.
         """
 
-        def exp(tokens):
-                token = tokens.pop(0)
-                if token == "(":
-                        exp_ = []
-                        while tokens and (tokens[0] != ")"):
-                                exp_.append(exp(tokens))
-                        tokens.pop(0)
-                else:
-                        if   re.fullmatch(BOOL_RE, token):
-                                exp_ = True if token == "True" else False
-                        elif re.fullmatch(INT_RE,  token):
-                                exp_ = int(token)
-                        elif token[0] == token[-1] == '"':
-                                exp_ = token[1:-1]
-                        else:
-                                exp_ = (token,)
-
-                return exp_
-
-        ast = []
-        while tokens:
-                ast.append(exp(tokens))
-
-        return ast
+        return list(gen_exps(tokens))
+
+def read_exps(file):
+        """
+        Generates expressions from intermediate code files.
+
+        Files are read in chunks.
+        """
+
+        return gen_exps(gen_tokens(iter(lambda : file.read(CHUNK_SIZE), "")))
 
 def exps(int_code):
         """
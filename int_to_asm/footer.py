@@ -8,5 +8,5 @@ EXP_CUR:      first_exp
 ENV_NEWEST:   0x00001000
 STACK_OLDEST: 0x00001000
 STACK_NEWEST: 0x00001000
-PRINTER_DATA: 0x00001000
+PRINTER_DATA: 0x00fffffc
 """
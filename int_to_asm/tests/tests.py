@@ -262,3 +262,33 @@ False
 ()
 """
                 output = comp_state(program)
+
+        def test_link(self):
+                asm_to  = "../../asm_to_mach/"
+                with open("__program__", "w") as f:
+                        f.write('(1 "hello" (True))\n7\n')
+                program = subprocess.check_output(["../int_to_asm",
+                                                   "--program", "__program__"])
+                runtime = subprocess.check_output(["../int_to_asm",
+                                                   "--runtime"])
+                files   = {"__runtime__"  : runtime,
+                           "__asm_code__" : program,
+                           "__full__"     : runtime + program}
+                for e in files:
+                        with open(e, "wb") as f:
+                                f.write(files[e])
+                for e in ["__runtime__", "__asm_code__"]:
+                        obj = subprocess.check_output([asm_to + "asm_to_mach",
+                                                       "--object", e])
+                        with open(e + "obj", "wb") as f:
+                                f.write(obj)
+                output  = subprocess.check_output([asm_to + "link",
+                                                   "__runtime__obj",
+                                                   "__asm_code__obj"])
+                answer  = subprocess.check_output([asm_to + "asm_to_mach",
+                                                   "__full__"])
+                self.assertEqual(output, answer)
+                for e in ["__program__", "__runtime__obj", "__asm_code__obj"]:
+                        os.remove(e)
+                for e in files:
+                        os.remove(e)
@@ -0,0 +1,209 @@
+"""
+Copyright 2025 Christian Seberino
+
+This file is part of Pylayers.
+
+Pylayers is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+Pylayers is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+Pylayers. If not, see <https://www.gnu.org/licenses/>.
+
+________________________________________________________________________________
+
+
+Contains the compiler.
+
+Converts expressions to Python functions referred to as closures.  Running
+closures with environments gives the same results as evaluating the
+expressions with the evaluator.  Expressions are only compiled once but the
+closures can be run any number of times.  Therefore, the checks the evaluator
+performs to determine what kinds of expressions are being evaluated are only
+done once.  List closures remember the last function or macro invoked and how
+to invoke it.  Function and macro arguments are compiled when first needed.
+Closures invoke each other with Python recursion.  Therefore, once functions
+and macros are nested MAX_DEPTH deep, their bodies are evaluated by the
+evaluator which does not use Python recursion.
+"""
+
+from eval_ import Env, Expansions, is_var, is_atom, is_list, is_pure
+from eval_ import prep_args, eval_, eval_quote, eval_if, eval_set, set_var
+
+MAX_DEPTH = 2 ** 5
+DEPTH     = {"calls" : 0}
+
+def eval_func(args, env, body = None):
+        """
+        Implements the func function.
+
+        Returns functions with compiled bodies.  Body closures can be passed in
+        so that they can be reused.  The parameters, bodies and environments
+        are kept so that the evaluator can also invoke functions.
+        """
+
+        body = [compile_(e) for e in args[1:]] if body is None else body
+
+        @prep_args
+        def func(args_, env_, params = args[0]):
+                if is_var(params):
+                        params, args_ = [params], [args_]
+                env__ = Env(zip(params, args_), env)
+                if DEPTH["calls"] >= MAX_DEPTH:
+                        for e in args[1:]:
+                                result = eval_(e, env__)
+
+                        return result
+                DEPTH["calls"] += 1
+                try:
+                        for e in body:
+                                result = e(env__)
+                finally:
+                        DEPTH["calls"] -= 1
+
+                return result
+        func.params, func.body, func.env = args[0], args[1:], env
+
+        return func
+
+def eval_macro(args, env, body = None):
+        """
+        Implements the macro function.
+
+        Returns macros with compiled bodies.  Body closures can be passed in so
+        that they can be reused.  The results of running body closures are
+        compiled and run.  The compiled expansions of pure macros are cached.
+        The parameters, bodies and environments are kept so that the evaluator
+        can also invoke macros.
+        """
+
+        body = [compile_(e) for e in args[1:]] if body is None else body
+
+        def macro(args_, env_, params = args[0]):
+                def expand(params = params, args_ = args_):
+                        if is_var(params):
+                                params, args_ = [params], [args_]
+                        env__ = Env(zip(params, args_), env)
+
+                        return [compile_(e(env__)) for e in body]
+
+                if DEPTH["calls"] >= MAX_DEPTH:
+                        return eval_([macro] + args_, env_)
+                DEPTH["calls"] += 1
+                try:
+                        if macro.pure:
+                                closures = macro.closures.get(args_, args_,
+                                                                       expand)
+                        else:
+                                closures = expand()
+                        for e in closures:
+                                result = e(env_)
+                finally:
+                        DEPTH["calls"] -= 1
+
+                return result
+        macro.params, macro.body, macro.env = args[0], args[1:], env
+        macro.pure,   macro.cache           = is_pure(args[0], args[1:]),     \
+                                              Expansions()
+        macro.closures                      = Expansions()
+
+        return macro
+
+def invoker(func, args, args_):
+        """
+        Creates invokers.
+
+        Invokers are closures that invoke specific functions or macros.  args_
+        compiles the arguments when needed.
+        """
+
+        if   func is eval_quote and len(args) >= 1:
+                exp = args[0]
+                def invoker_(env):
+                        return exp
+        elif func is eval_if   and len(args) >= 3:
+                cond, true, false = args_()[:3]
+                def invoker_(env):
+                        return true(env) if cond(env) else false(env)
+        elif func is eval_set  and len(args) >= 2:
+                var, val = args[0], args_()[1]
+                def invoker_(env):
+                        return set_var(env, var, val(env))
+        elif func in (eval_func, eval_macro):
+                body = [compile_(e) for e in args[1:]]
+                def invoker_(env):
+                        return func(args, env, body)
+        elif hasattr(func, "func"):
+                func_ = func.func
+                args_ = args_()
+                if   len(args_) == 1:
+                        a, = args_
+                        def invoker_(env):
+                                return func_([a(env)], env)
+                elif len(args_) == 2:
+                        a, b = args_
+                        def invoker_(env):
+                                return func_([a(env), b(env)], env)
+                else:
+                        def invoker_(env):
+                                return func_([e(env) for e in args_], env)
+        else:
+                def invoker_(env):
+                        return func(args, env)
+
+        return invoker_
+
+def compile_list(exp):
+        """
+        Compiles lists.
+
+        The resulting closures evaluate the first elements and then invoke the
+        results.
+        """
+
+        func    = compile_(exp[0])
+        args    = exp[1:]
+        args_   = []
+        last    = [None, None]
+
+        def args__():
+                if len(args_) != len(args):
+                        args_[:] = [compile_(e) for e in args]
+
+                return args_
+
+        def list_(env):
+                func_ = func(env)
+                if func_ is not last[0]:
+                        last[:] = func_, invoker(func_, args, args__)
+
+                return last[1](env)
+
+        return list_
+
+def compile_(exp):
+        """
+        Implements the compiler.
+
+        Results depend on whether expressions are atoms or lists.  Anything
+        else is left to the evaluator.
+        """
+
+        if   is_var(exp):
+                def closure(env):
+                        return env[exp]
+        elif is_atom(exp):
+                def closure(env):
+                        return exp
+        elif is_list(exp) and exp:
+                closure = compile_list(exp)
+        else:
+                def closure(env):
+                        return eval_(exp, env)
+
+        return closure
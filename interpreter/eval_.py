@@ -23,9 +23,217 @@ Contains the evaluator.
 Evaluates expressions.
 """
 
+import itertools
 import types
 
 FUNC = types.FunctionType
+END  = object()
+PURE = ["quote", "if", "equal", "atom", "first", "rest", "append", "prepend",
+        "add", "negate", "gt", "block", "list", "len", "extend", "index",
+        "last", "second", "third", "reverse", "range", "slice", "zip", "+",
+        "-", "*", "/", "%", "^", "abs", "=", ">", ">=", "<", "<=", "!=", "and",
+        "or", "xor", "not", "&", "|", "^^", "~", "<<", ">>"]
+
+CACHE_SIZE  = 2 ** 12
+ARGS_LEN    = 2 ** 8
+CACHE_STATS = {"hits" : 0, "misses" : 0}
+
+INVOKE, ARG, IF, SET, BODY, MACRO, EXPAND = range(7)
+
+class Env(dict):
+        """
+        Implements environments.
+
+        Environments only contain their own variables.  All other variables are
+        looked up in parent environments.  Adding to environments never
+        modifies parent environments.
+        """
+
+        def __init__(self, vars_, parent):
+                super().__init__(vars_)
+                self.parent = parent
+
+        def __missing__(self, var):
+                return self.parent[var]
+
+class Cons:
+        """
+        Implements linked lists.
+
+        Linked lists are pairs of first elements and rests.  Rests are other
+        linked lists or Python lists.  Linked lists are never modified so rests
+        can be shared.  Therefore, getting rests and prepending elements do not
+        require copying.  Linked lists are equal to Python lists with equal
+        elements.
+        """
+
+        __slots__ = ("first", "rest")
+
+        def __init__(self, first, rest):
+                self.first = first
+                self.rest  = rest
+
+        def __iter__(self):
+                list_ = self
+                while isinstance(list_, Cons):
+                        yield list_.first
+                        list_ = list_.rest
+                yield from list_
+
+        def __eq__(self, other):
+                if not isinstance(other, (list, Cons)):
+                        return NotImplemented
+                pairs = itertools.zip_longest(self, other, fillvalue = END)
+
+                return all(a == b for a, b in pairs)
+
+        __hash__ = None
+
+class Expansions:
+        """
+        Implements macro expansion caches.
+
+        Expansions are looked up by invocation or, failing that, by keys made
+        from the arguments.  Invocations are objects that are the same every
+        time a specific invocation is evaluated.  Arguments with more than
+        ARGS_LEN parts are instead looked up by the identities of their
+        elements so that keys are cheap to make.  Macros that invoke themselves
+        with the same argument objects still hit.  Caches are cleared when they
+        get too large or when the functions in PURE are set.  Hits and misses
+        are counted in CACHE_STATS.
+        """
+
+        generation = 0
+
+        def __init__(self):
+                self.invocations = {}
+                self.args        = {}
+                self.generation  = Expansions.generation
+
+        @staticmethod
+        def invalidate():
+                """
+                Invalidates all caches.
+                """
+
+                Expansions.generation += 1
+
+        def get(self, invocation, args, expand):
+                """
+                Gets expansions.
+
+                Invokes expand to create expansions which are not found.
+                """
+
+                if self.generation != Expansions.generation:
+                        self.invocations.clear()
+                        self.args.clear()
+                        self.generation = Expansions.generation
+                if id(invocation) in self.invocations:
+                        CACHE_STATS["hits"] += 1
+
+                        return self.invocations[id(invocation)][1]
+                key = args_key(args)
+                if key is None:
+                        key = (None,) + tuple(id(e) for e in args)
+                if key in self.args:
+                        CACHE_STATS["hits"]   += 1
+                        expansions             = self.args[key][1]
+                else:
+                        CACHE_STATS["misses"] += 1
+                        expansions             = expand()
+                if len(self.invocations) >= CACHE_SIZE or \
+                                                 len(self.args) >= CACHE_SIZE:
+                        self.invocations.clear()
+                        self.args.clear()
+                self.invocations[id(invocation)] = invocation, expansions
+                self.args[key]                   = args,       expansions
+
+                return expansions
+
+def args_key(args):
+        """
+        Helper function for macro expansion caches.
+
+        Returns keys made from arguments without recursion or None if the
+        arguments have more than ARGS_LEN parts or cannot be keys.  Keys are
+        tuples of the types and values of the atoms with markers for where
+        lists begin and end.
+        """
+
+        result, exps = [], [args]
+        while exps:
+                exp = exps.pop()
+                if len(result) > ARGS_LEN:
+                        return None
+                if   exp is END:
+                        result.append(1)
+                elif isinstance(exp, (list, Cons)):
+                        parts = list(itertools.islice(exp, ARGS_LEN + 1))
+                        if len(parts) > ARGS_LEN:
+                                return None
+                        result.append(0)
+                        exps.append(END)
+                        exps.extend(reversed(parts))
+                elif isinstance(exp, (bool, int, str, tuple)):
+                        result.append((type(exp), exp))
+                else:
+                        return None
+
+        return tuple(result)
+
+def is_pure(params, body):
+        """
+        Identifies pure macros.
+
+        Pure macro bodies only contain parameters, the functions in PURE and
+        quoted expressions.  Therefore, the expansions of pure macros only
+        depend on the arguments and can be cached.
+        """
+
+        params = [params] if is_var(params) else params
+        exps   = list(body)
+        while exps:
+                exp = exps.pop()
+                if   is_var(exp):
+                        if (exp not in params) and (exp[0] not in PURE):
+                                return False
+                elif is_list(exp) and exp:
+                        if exp[0] != ("quote",):
+                                exps.extend(exp)
+                elif not isinstance(exp, (bool, int, str, list)):
+                        return False
+
+        return True
+
+def expansions(macro, invocation, args):
+        """
+        Helper function for pure macros.
+
+        Returns the expansions of macro invocations which may be cached.
+        """
+
+        def expand(params = macro.params, args_ = args):
+                if is_var(params):
+                        params, args_ = [params], [args_]
+                env = Env(zip(params, args_), macro.env)
+
+                return [eval_(e, env) for e in macro.body]
+
+        return macro.cache.get(invocation, args, expand)
+
+def cons(list_):
+        """
+        Converts Python lists to linked lists.
+
+        Empty lists are not converted.
+        """
+
+        result = []
+        for e in reversed(list_):
+                result = Cons(e, result)
+
+        return result
 
 def is_var(exp):
         """
@@ -58,11 +266,14 @@ def prep_args(func):
         """
         Adds argument evaluation to functions.
 
-        Used by all functions except for quote, if, set, func and macro.
+        Used by all functions except for quote, if, set, func and macro.  The
+        original functions are kept so that evaluated arguments can also be
+        passed directly.
         """
 
         def func_(args, env):
                 return func([eval_(e, env) for e in args], env)
+        func_.func = func
 
         return func_
 
@@ -96,26 +307,42 @@ def eval_set(args, env):
         Adds to environments.  Returns the values added to environments.
         """
 
-        env[args[0]] = eval_(args[1], env)
+        return set_var(env, args[0], eval_(args[1], env))
 
-        return env[args[0]]
+def set_var(env, var, val):
+        """
+        Helper function for setting variables.
+
+        Setting the functions in PURE invalidates all macro expansion caches.
+        Returns the values set.
+        """
+
+        if var[0] in PURE:
+                Expansions.invalidate()
+        env[var] = val
+
+        return env[var]
 
 def eval_func(args, env):
         """
         Implements the func function.
 
-        Returns functions.  Special environments are used.
+        Returns functions.  Special environments are used which only contain
+        the parameters and refer to the environments of the definitions.  The
+        parameters, bodies and environments are kept so that the evaluator can
+        invoke functions without recursion.
         """
 
         @prep_args
         def func(args_, env_, params = args[0], body = args[1:]):
                 if is_var(params):
                         params, args_ = [params], [args_]
-                env__ = env | dict(zip(params, args_))
+                env__ = Env(zip(params, args_), env)
                 for e in body:
                         result = eval_(e, env__)
 
                 return result
+        func.params, func.body, func.env = args[0], args[1:], env
 
         return func
 
@@ -124,17 +351,28 @@ def eval_macro(args, env):
         Implements the macro function.
 
         Returns macros.  Macros require two evaluations for every body
-        expression.  Special environments are used.
+        expression.  Special environments are used which only contain the
+        parameters and refer to the environments of the definitions.  The
+        parameters, bodies and environments are kept so that the evaluator can
+        invoke macros without recursion.  The expansions of pure macros are
+        cached.
         """
 
         def macro(args_, env_, params = args[0], body = args[1:]):
-                if is_var(params):
-                        params, args_ = [params], [args_]
-                env__  = env | dict(zip(params, args_))
-                for e in body:
-                        result = eval_(eval_(e, env__), env_)
+                if macro.pure:
+                        for e in expansions(macro, args_, args_):
+                                result = eval_(e, env_)
+                else:
+                        if is_var(params):
+                                params, args_ = [params], [args_]
+                        env__ = Env(zip(params, args_), env)
+                        for e in body:
+                                result = eval_(eval_(e, env__), env_)
 
                 return result
+        macro.params, macro.body, macro.env = args[0], args[1:], env
+        macro.pure,   macro.cache           = is_pure(args[0], args[1:]),     \
+                                              Expansions()
 
         return macro
 
@@ -166,27 +404,52 @@ def eval_first(args, env):
         Returns the first element or an empty list.
         """
 
-        return args[0][0] if args[0] else []
+        if isinstance(args[0], Cons):
+                result = args[0].first
+        else:
+                result = args[0][0] if args[0] else []
+
+        return result
 
 @prep_args
 def eval_rest(args, env):
         """
         Implements the rest function.
 
-        Returns lists with the first element removed.
+        Returns lists with the first element removed.  Python lists are
+        converted to linked lists so that later rests do not require copying.
         """
 
-        return args[0][1:]
+        if   isinstance(args[0], Cons):
+                result = args[0].rest
+        elif isinstance(args[0], list):
+                result = cons(args[0]).rest if args[0] else []
+        else:
+                result = args[0][1:]
+
+        return result
 
 @prep_args
 def eval_append(args, env):
         """
         Implements the append function.
 
-        Appends to lists.
+        Appends to lists.  Always requires copying.
         """
 
-        return args[0] + [args[1]]
+        list_ = list(args[0]) if isinstance(args[0], Cons) else args[0]
+
+        return list_ + [args[1]]
+
+@prep_args
+def eval_prepend(args, env):
+        """
+        Implements the prepend function.
+
+        Prepends to lists.  Never requires copying.
+        """
+
+        return Cons(args[0], args[1])
 
 @prep_args
 def eval_add(args, env):
@@ -232,7 +495,7 @@ def eval_print(args, env):
                         exp_ = f'"{exp}"'
                 elif isinstance(exp, tuple):
                         exp_ = exp[0]
-                elif isinstance(exp, list):
+                elif isinstance(exp, (list, Cons)):
                         exp_ = f"({' '.join([exp_str(e) for e in exp])})"
 
                 return exp_
@@ -245,12 +508,117 @@ def eval_(exp, env):
         """
         Implements the evaluator.
 
-        Results depend on whether expressions are atoms or lists.
-        """
-
-        if   is_atom(exp):
-                result = env[exp] if is_var(exp) else exp
-        elif is_list(exp):
-                result = eval_(exp[0], env)(exp[1:], env) if exp else []
-
-        return result
+        Results depend on whether expressions are atoms or lists.  Rather than
+        invoking itself, the evaluator keeps a stack of the work remaining
+        after subexpressions are evaluated.  Nothing is added to the stack for
+        expressions in tail positions which are the last body expressions of
+        functions and macros and the expressions if chooses.  Therefore, tail
+        recursion does not grow the stack and other recursion is only limited
+        by memory.
+        """
+
+        stack = []
+        while True:
+                if   is_atom(exp):
+                        val = env[exp] if is_var(exp) else exp
+                elif is_list(exp) and exp:
+                        stack.append((INVOKE, exp, env))
+                        exp = exp[0]
+                        continue
+                elif is_list(exp):
+                        val = []
+                elif isinstance(exp, Cons):
+                        exp = list(exp)
+                        continue
+                else:
+                        raise TypeError(f"cannot evaluate {exp!r}")
+
+                while stack:
+                        work = stack.pop()
+                        kind = work[0]
+                        if   kind == INVOKE:
+                                _, args, env = work
+                                func, node   = val, args
+                                args         = node[1:]
+                                if   func is eval_if:
+                                        stack.append((IF, args, env))
+                                        exp = args[0]
+                                        break
+                                elif func is eval_set:
+                                        stack.append((SET, args, env))
+                                        exp = args[1]
+                                        break
+                                elif hasattr(func, "func") and args:
+                                        stack.append((ARG, func, args, env, []))
+                                        exp = args[0]
+                                        break
+                                elif hasattr(func, "func"):
+                                        vals = []
+                                elif hasattr(func, "body") and func.pure:
+                                        exps = expansions(func, node, args)
+                                        if len(exps) > 1:
+                                                stack.append((BODY, exps, 1,
+                                                                          env))
+                                        exp = exps[0]
+                                        break
+                                elif hasattr(func, "body"):
+                                        params, body, env_ = func.params,      \
+                                                             func.body, env
+                                        if is_var(params):
+                                                params, args = [params], [args]
+                                        env = Env(zip(params, args), func.env)
+                                        stack.append((EXPAND, body, 0, env,
+                                                                         env_))
+                                        exp = body[0]
+                                        break
+                                else:
+                                        val = func(args, env)
+                                        continue
+                        elif kind == ARG:
+                                _, func, args, env, vals = work
+                                vals.append(val)
+                                if len(vals) < len(args):
+                                        stack.append(work)
+                                        exp = args[len(vals)]
+                                        break
+                        elif kind == IF:
+                                _, args, env = work
+                                exp          = args[1] if val else args[2]
+                                break
+                        elif kind == SET:
+                                _, args, env = work
+                                val          = set_var(env, args[0], val)
+                                continue
+                        elif kind == BODY:
+                                _, body, i, env = work
+                                if i + 1 < len(body):
+                                        stack.append((BODY, body, i + 1, env))
+                                exp = body[i]
+                                break
+                        elif kind == EXPAND:
+                                _, body, i, env_, env = work
+                                if i + 1 < len(body):
+                                        stack.append((MACRO, body, i + 1, env_,
+                                                                          env))
+                                exp = val
+                                break
+                        elif kind == MACRO:
+                                _, body, i, env, env_ = work
+                                stack.append((EXPAND, body, i, env, env_))
+                                exp = body[i]
+                                break
+
+                        # Invokes functions with evaluated arguments.
+
+                        if hasattr(func, "body"):
+                                params, body = func.params, func.body
+                                if is_var(params):
+                                        params, vals = [params], [vals]
+                                env = Env(zip(params, vals), func.env)
+                                if len(body) > 1:
+                                        stack.append((BODY, body, 1, env))
+                                exp = body[0]
+                                break
+                        val = func.func(vals, env)
+                else:
+                        return val
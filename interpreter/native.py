@@ -0,0 +1,299 @@
+"""
+Copyright 2025 Christian Seberino
+
+This file is part of Pylayers.
+
+Pylayers is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+Pylayers is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+Pylayers. If not, see <https://www.gnu.org/licenses/>.
+
+________________________________________________________________________________
+
+
+Contains the native library.
+
+Implements the math, bits, comparison and logic parts of the library in Python.
+The library implementations in the language are very slow.  For example,
+multiplication is repeated addition.  These functions give the same results as
+the library implementations in the language.  Division truncates towards zero
+and negative moduli are not always the same as in Python.
+"""
+
+from eval_ import prep_args
+
+def divide(a, b):
+        """
+        Helper function for division.
+
+        Truncates towards zero.  Returns an empty list for division by zero.
+        """
+
+        if b == 0:
+                result = []
+        else:
+                result = abs(a) // abs(b)
+                same   = (a >= 0 and b >= 0) or (a <= 0 and b <= 0)
+                result = result if same else -result
+
+        return result
+
+def modulo(a, b):
+        """
+        Helper function for the modulo function.
+
+        Returns an empty list for modulo by zero.
+        """
+
+        if b == 0:
+                result = []
+        else:
+                result = a - b * divide(a, b)
+                result = result if (a >= 0) or (a == -b) else result + b
+
+        return result
+
+def power(a, b):
+        """
+        Helper function for exponentiation.
+
+        Negative exponents lead to zero unless the base is one or negative one.
+        """
+
+        if   a == 0:
+                result = [] if b <= 0 else 0
+        elif b == 0:
+                result = 1
+        elif b > 0:
+                result = a ** b
+        else:
+                result = 0 if abs(a) > 1 else a ** -b
+
+        return result
+
+def bitwise(bit_func):
+        """
+        Helper function for bitwise functions.
+
+        Returns functions applying bit functions to every pair of bits.
+        Negative numbers are handled one bit at a time like in the library.
+        """
+
+        @prep_args
+        def func(args, env):
+                a, b = args[0], args[1]
+                if (a >= 0) and (b >= 0):
+                        result = bit_func(a, b)
+                else:
+                        result, bit = 0, 1
+                        while not ((a == 0) and (b == 0)):
+                                pair    = bool(modulo(a, 2)), bool(modulo(b, 2))
+                                result += bit * bit_func(*pair)
+                                a, b    = divide(a, 2), divide(b, 2)
+                                bit    *= 2
+
+                return result
+
+        return func
+
+@prep_args
+def mult(args, env):
+        """
+        Implements the multiplication function.
+
+        Only operates on numbers.
+        """
+
+        return args[0] * args[1]
+
+@prep_args
+def div(args, env):
+        """
+        Implements the division function.
+
+        Only operates on numbers.
+        """
+
+        return divide(args[0], args[1])
+
+@prep_args
+def mod(args, env):
+        """
+        Implements the modulo function.
+
+        Only operates on numbers.
+        """
+
+        return modulo(args[0], args[1])
+
+@prep_args
+def exp(args, env):
+        """
+        Implements the exponentiation function.
+
+        Only operates on numbers.
+        """
+
+        return power(args[0], args[1])
+
+@prep_args
+def dash(args, env):
+        """
+        Implements the dash function.
+
+        Negates one number or subtracts two.
+        """
+
+        return -args[0] if len(args) == 1 else args[0] + -args[1]
+
+@prep_args
+def abs_(args, env):
+        """
+        Implements the absolute value function.
+
+        Only operates on numbers.
+        """
+
+        return args[0] if args[0] >= 0 else -args[0]
+
+@prep_args
+def gtoe(args, env):
+        """
+        Implements the greater than or equal function.
+
+        Only operates on numbers.
+        """
+
+        return (args[0] > args[1]) or (args[0] == args[1])
+
+@prep_args
+def lt(args, env):
+        """
+        Implements the less than function.
+
+        Only operates on numbers.
+        """
+
+        return -args[0] > -args[1]
+
+@prep_args
+def ltoe(args, env):
+        """
+        Implements the less than or equal function.
+
+        Only operates on numbers.
+        """
+
+        return (-args[0] > -args[1]) or (args[0] == args[1])
+
+@prep_args
+def not_eq(args, env):
+        """
+        Implements the not equal function.
+
+        Operates on more than numbers.
+        """
+
+        return not (args[0] == args[1])
+
+@prep_args
+def logic_and(args, env):
+        """
+        Implements the logical and function.
+
+        Returns booleans.
+        """
+
+        return bool(args[0]) and bool(args[1])
+
+@prep_args
+def logic_or(args, env):
+        """
+        Implements the logical or function.
+
+        Returns booleans.
+        """
+
+        return bool(args[0]) or bool(args[1])
+
+@prep_args
+def logic_xor(args, env):
+        """
+        Implements the logical exclusive or function.
+
+        Returns booleans.
+        """
+
+        return bool(args[0]) != bool(args[1])
+
+@prep_args
+def logic_not(args, env):
+        """
+        Implements the logical not function.
+
+        Returns booleans.
+        """
+
+        return not args[0]
+
+@prep_args
+def bitwise_not(args, env):
+        """
+        Implements the bitwise not function.
+
+        Only operates on numbers.
+        """
+
+        return -args[0] + -1
+
+@prep_args
+def l_shift(args, env):
+        """
+        Implements the left shift function.
+
+        Negative shifts lead to zero.
+        """
+
+        return args[0] * power(2, args[1])
+
+@prep_args
+def r_shift(args, env):
+        """
+        Implements the right shift function.
+
+        Negative shifts lead to empty lists.
+        """
+
+        return divide(args[0], power(2, args[1]))
+
+bitwise_and = bitwise(lambda a, b : a & b)
+bitwise_or  = bitwise(lambda a, b : a | b)
+bitwise_xor = bitwise(lambda a, b : a ^ b)
+
+LIBRARY = {("*",)   : mult,
+           ("/",)   : div,
+           ("%",)   : mod,
+           ("^",)   : exp,
+           ("-",)   : dash,
+           ("abs",) : abs_,
+           (">=",)  : gtoe,
+           ("<",)   : lt,
+           ("<=",)  : ltoe,
+           ("!=",)  : not_eq,
+           ("and",) : logic_and,
+           ("or",)  : logic_or,
+           ("xor",) : logic_xor,
+           ("not",) : logic_not,
+           ("~",)   : bitwise_not,
+           ("<<",)  : l_shift,
+           (">>",)  : r_shift,
+           ("&",)   : bitwise_and,
+           ("|",)   : bitwise_or,
+           ("^^",)  : bitwise_xor}
@@ -28,24 +28,28 @@ Tests the script, evaluator and library.
 import sys
 sys.path.append("..")
 
+import compile_
 import eval_
 import exps
+import native
 import unittest
 import subprocess
 import string
 import re
+import pickle
 import os
 
 FUNC = r"<function (eval_{}|prep_args\.<locals>\.func_) at 0x[0-9a-f]*>"
 ENV  = [e for e in dir(eval_) if e.startswith("eval_")]
 ENV  = {(e[len("eval_"):],) : getattr(eval_, e) for e in ENV}
+OPTS = []
 
 def run_and_print_all(program):
         with open("__program__", "w") as f:
                 f.write(program)
         output = subprocess.check_output(["python3",
-                                          "../interpreter_print_all",
-                                          "__program__"])
+                                          "../interpreter_print_all"] +
+                                          OPTS + ["__program__"])
         os.remove("__program__")
 
         return output
@@ -54,8 +58,8 @@ def run_only(program):
         with open("__program__", "w") as f:
                 f.write(program)
         output = subprocess.check_output(["python3",
-                                          "../interpreter",
-                                          "__program__"])
+                                          "../interpreter"] +
+                                          OPTS + ["__program__"])
         os.remove("__program__")
 
         return output
@@ -353,6 +357,59 @@ class Tester(unittest.TestCase):
                 answer = []
                 self.assertEqual(output, answer)
 
+        def test_cons(self):
+                l      = eval_.cons([3, [4, 5], "abc"])
+                output = l.first, l.rest.first, l.rest.rest.rest
+                answer = 3, [4, 5], []
+                self.assertEqual(output, answer)
+
+                output = l == [3, [4, 5], "abc"], [3, [4, 5], "abc"] == l
+                answer = True, True
+                self.assertEqual(output, answer)
+
+                output = l == [3, [4, 5]], l == [], l == 3
+                answer = False, False, False
+                self.assertEqual(output, answer)
+
+                output = eval_.eval_rest([[("quote",), [3, 5, 7]]], ENV)
+                self.assertTrue(isinstance(output, eval_.Cons))
+                self.assertTrue(eval_.eval_rest.func([output], {}) is         \
+                                                                   output.rest)
+
+                output = eval_.eval_prepend.func([1, output], {})
+                answer = [1, 5, 7]
+                self.assertEqual(output, answer)
+                self.assertEqual(eval_.eval_first.func([output], {}), 1)
+
+                output = eval_.eval_append.func([output, 9], {})
+                answer = [1, 5, 7, 9]
+                self.assertEqual(output, answer)
+
+                output = eval_.eval_([("quote",), l], ENV)
+                answer = [3, [4, 5], "abc"]
+                self.assertEqual(output, answer)
+
+                output = eval_.eval_(eval_.cons([("add",), 1, 2]), ENV)
+                answer = 3
+                self.assertEqual(output, answer)
+
+                program = \
+'''
+(rest (quote (4 "a" (b c))))
+(prepend 3 (rest (list 1 2)))
+(= (rest (list 1 2)) (list 2))
+(len (range 0 100 1))
+'''
+                answer  = \
+b'''\
+("a" (b c))
+(3 2)
+True
+100
+'''
+                output  = run_and_print_all(program)
+                self.assertEqual(output, answer)
+
         def test_append(self):
                 l      = []
                 output = eval_.eval_append([l, 3], {})
@@ -524,6 +581,31 @@ class Tester(unittest.TestCase):
                 output = uf(args, {})
                 self.assertEqual(output, answer)
 
+        def test_env(self):
+                parent = {("x",) : 1, ("y",) : 2}
+                env    = eval_.Env([(("y",), 3)], parent)
+                output = env["x",], env["y",], len(env)
+                answer = 1, 3, 1
+                self.assertEqual(output, answer)
+
+                eval_.eval_set([("z",), 4], env)
+                output = env["z",], ("z",) in parent
+                answer = 4, False
+                self.assertEqual(output, answer)
+
+                parent["x",] = 5
+                output       = env["x",]
+                answer       = 5
+                self.assertEqual(output, answer)
+
+                env_   = eval_.Env([], env)
+                output = env_["x",], env_["y",], env_["z",]
+                answer = 5, 3, 4
+                self.assertEqual(output, answer)
+
+                with self.assertRaises(KeyError):
+                        env_["w",]
+
         def test_eval_(self):
                 output = eval_.eval_(True, {})
                 answer = True
@@ -596,6 +678,92 @@ class Tester(unittest.TestCase):
                 answer = (-6 + 5) - ( (95 + 5) - 900 )
                 self.assertEqual(output, answer)
 
+        def test_compile_(self):
+                env    = ENV | {("func",)  : compile_.eval_func,
+                                ("macro",) : compile_.eval_macro}
+
+                output = compile_.compile_(-79203987423)(env)
+                answer = -79203987423
+                self.assertEqual(output, answer)
+
+                output = compile_.compile_(("quote",))(env)
+                answer = eval_.eval_quote
+                self.assertEqual(output, answer)
+
+                output = compile_.compile_([])(env)
+                answer = []
+                self.assertEqual(output, answer)
+
+                l      = [("append",), [("quote",), ["abc", 5]], False]
+                output = compile_.compile_(l)(env)
+                answer = ["abc", 5, False]
+                self.assertEqual(output, answer)
+
+                l      = [("if",), [("gt",), 3, 4], ("undefined",), 7]
+                output = compile_.compile_(l)(env)
+                answer = 7
+                self.assertEqual(output, answer)
+
+                addx   = [("func",),
+                          [("x",), ("y",)],
+                          [("add",), ("x",), ("y",)]]
+                negx   = [("func",), [("x",)], [("negate",), ("x",)]]
+                sub    = [("func",),
+                          [("x",), ("y",)],
+                          [addx, ("x",), [negx, ("y",)]]]
+                add5   = [("func",), [("x",)], [addx, ("x",), 5]]
+
+                l      = [sub, [add5, -6], [sub, [add5, 95], 900]]
+                closure = compile_.compile_(l)
+                for i in range(3):
+                        output = closure(env)
+                        answer = (-6 + 5) - ( (95 + 5) - 900 )
+                        self.assertEqual(output, answer)
+
+                l      = [("set",), ("f",), [("func",), ("x",), ("x",)]]
+                compile_.compile_(l)(env)
+                output = eval_.eval_([("f",), 1, 2], env)
+                answer = [1, 2]
+                self.assertEqual(output, answer)
+
+                l      = [("set",), ("g",), [("macro",), [("x",)], ("x",)]]
+                compile_.compile_(l)(env)
+                output = compile_.compile_([("g",), [("add",), 1, 2]])(env)
+                answer = 3
+                self.assertEqual(output, answer)
+
+        def test_native(self):
+                if OPTS:
+                        self.skipTest("does not depend on the options")
+
+                env = dict(ENV)
+                for folder, _, files in os.walk("../library"):
+                        for file in files:
+                                with open(os.path.join(folder, file)) as f:
+                                        for e in exps.exps(f.read()):
+                                                eval_.eval_(e, env)
+
+                for var, func in native.LIBRARY.items():
+                        for a in range(-3, 4):
+                                for b in range(-3, 4):
+                                        output = func.func([a, b], env)
+                                        answer = eval_.eval_([var, a, b], env)
+                                        self.assertEqual(output, answer)
+                                        self.assertEqual(type(output),
+                                                         type(answer))
+
+                for var in [("-",), ("abs",), ("not",), ("~",)]:
+                        for a in [-7, -1, 0, 1, 7, True, False]:
+                                output = native.LIBRARY[var].func([a], env)
+                                answer = eval_.eval_([var, a], env)
+                                self.assertEqual(output, answer)
+
+                for a, b in [(100, 99), (-75, 38), (64, -3), (-9, -9)]:
+                        for var in [("&",), ("|",), ("^^",)]:
+                                output = native.LIBRARY[var].func([a, b], env)
+                                answer = eval_.eval_([var, a, b], env)
+                                self.assertEqual(output, answer)
+
         def test_tokenizer(self):
                 output = exps.tokenizer("abc")
                 answer = ["abc"]
@@ -698,6 +866,66 @@ a
                            ("c",)]]
                 self.assertEqual(output, answer)
 
+        def test_gen_tokens(self):
+                prog   = \
+"""
+(set s "a (string) # not a comment") # a (comment)
+(quote (True -23 abc))# another comment
+"last"
+"""
+                answer = exps.tokenizer(prog)
+                for size in range(1, len(prog) + 1):
+                        chunks = range(0, len(prog), size)
+                        chunks = [prog[i:i + size] for i in chunks]
+                        output = list(exps.gen_tokens(chunks))
+                        self.assertEqual(output, answer)
+
+                output = next(exps.gen_exps(exps.gen_tokens(iter([prog]))))
+                answer = [("set",), ("s",), "a (string) # not a comment"]
+                self.assertEqual(output, answer)
+
+                with open("__program__", "w") as f:
+                        f.write(prog)
+                with open("__program__") as f:
+                        output = list(exps.read_exps(f))
+                os.remove("__program__")
+                answer = exps.exps(prog)
+                self.assertEqual(output, answer)
+
+                with self.assertRaises(SyntaxError):
+                        exps.tokenizer('(a "b)')
+                with self.assertRaises(SyntaxError):
+                        exps.exps("(a (b)")
+
+        def test_snapshot(self):
+                snapshot = "../__pycache__/library.pickle"
+                if os.path.exists(snapshot):
+                        os.remove(snapshot)
+                output   = run_only("(print (* 6 7))")
+                self.assertEqual(output.decode(), "42\n")
+                self.assertTrue(os.path.exists(snapshot))
+
+                with open(snapshot, "wb") as f:
+                        f.write(b"corrupt")
+                output   = run_only("(print (* 6 7))")
+                self.assertEqual(output.decode(), "42\n")
+                with open(snapshot, "rb") as f:
+                        self.assertNotEqual(f.read(), b"corrupt")
+
+                with open(snapshot, "rb") as f:
+                        key = pickle.load(f)[0]
+                stat     = os.stat("../exps.py")
+                os.utime("../exps.py", ns = (stat.st_atime_ns,
+                                             stat.st_mtime_ns + 10 ** 9))
+                try:
+                        output = run_only("(print (* 6 7))")
+                finally:
+                        os.utime("../exps.py", ns = (stat.st_atime_ns,
+                                                     stat.st_mtime_ns))
+                self.assertEqual(output.decode(), "42\n")
+                with open(snapshot, "rb") as f:
+                        self.assertNotEqual(pickle.load(f)[0], key)
+
         def test_print_(self):
                 program =  "True"
                 answer  = b"True\n"
@@ -1015,6 +1243,75 @@ True
                 self.assertTrue(re.match(answer[0], output[0]) and             \
                                                    (output[1:] == answer[1:]))
 
+        def test_macro_cache(self):
+                params = [("a",), ("b",)]
+                body   = [[("append",), [("quote",), [("set",)]], ("a",)]]
+                self.assertTrue( eval_.is_pure(params, body))
+                self.assertTrue( eval_.is_pure(("args",), [("args",)]))
+                self.assertFalse(eval_.is_pure(params, [("c",)]))
+                self.assertFalse(eval_.is_pure(params, [[("print",), ("a",)]]))
+                self.assertFalse(eval_.is_pure(params, [[("set",), ("a",), 1]]))
+
+                expansions = eval_.Expansions()
+                invocation = [("m",), 1, 2]
+                hits       = eval_.CACHE_STATS["hits"]
+                misses     = eval_.CACHE_STATS["misses"]
+                output     = expansions.get(invocation, [1, 2], lambda : [3])
+                output     = expansions.get(invocation, [1, 2], lambda : [4])
+                output     = expansions.get([("m",), 1, 2], [1, 2],
+                                                                 lambda : [5])
+                answer     = [3]
+                self.assertEqual(output, answer)
+                self.assertEqual(eval_.CACHE_STATS["hits"],   hits   + 2)
+                self.assertEqual(eval_.CACHE_STATS["misses"], misses + 1)
+
+                args = [("x",), ("l",)]
+                for i in range(5000):
+                        args = [args[0], [("rest",), args[1]]]
+                output = expansions.get([("for",)] + args, args,
+                                                                 lambda : [6])
+                answer = [6]
+                self.assertEqual(output, answer)
+                self.assertIsNone(eval_.args_key(args))
+                self.assertIsNone(eval_.args_key(list(range(300))))
+                self.assertEqual(eval_.args_key([True, [1]]),
+                                 (0, (bool, True), 0, (int, 1), 1, 1))
+
+                env    = eval_.Env({}, None)
+                output = expansions.get(invocation, [1, 2], lambda : [7])
+                answer = [3]
+                self.assertEqual(output, answer)
+                eval_.set_var(env, ("first",), 1)
+                output = expansions.get(invocation, [1, 2], lambda : [7])
+                answer = [7]
+                self.assertEqual(output, answer)
+
+                program = "(set i 0)\n(set j 0)\n(while (< i 50)" + \
+                          70 * " (set j (+ j 1))" + " (set i (+ i 1)))\n"
+                with open("__program__", "w") as f:
+                        f.write(program)
+                output  = subprocess.run(["python3", "../interpreter",
+                                          "--stats"] + OPTS + ["__program__"],
+                                         capture_output = True)
+                os.remove("__program__")
+                output  = output.stderr.decode()
+                output  = eval(output[output.find("{"):])
+                self.assertGreaterEqual(output["hits"], 49)
+
+                program = \
+'''
+(set shout (macro (a) (print "expanding") a))
+(set i 0)
+(while (< i 2) (shout i) (set i (+ i 1)))
+'''
+                answer  = \
+b'''\
+"expanding"
+"expanding"
+'''
+                output  = run_only(program)
+                self.assertEqual(output, answer)
+
         def test_log_and(self):
                 program = \
 '''
@@ -1149,6 +1446,40 @@ b'''\
                 output  = output.split(b"\n")[1:]
                 self.assertEqual(output, answer)
 
+        def test_deep_recursion(self):
+                program = \
+'''
+(set count-down
+     (func (n)
+           (if (= n 0)
+               "done"
+               (count-down (- n 1)))))
+
+(set adder
+     (func (n)
+           (if (<= n 1)
+               n
+               (+ n (adder (- n 1))))))
+
+(count-down 10000)
+(adder 3000)
+(set i 0)
+(while (< i 1000) (set i (+ i 1)))
+(len (range 0 5000 1))
+'''
+                answer  = \
+b'''\
+"done"
+4501500
+0
+True
+5000
+'''
+                answer  = answer.split(b"\n")
+                output  = run_and_print_all(program)
+                output  = output.split(b"\n")[2:]
+                self.assertEqual(output, answer)
+
         def test_mult(self):
                 program = \
 '''
@@ -2265,3 +2596,21 @@ b'''\
 '''
                 output  = run_only(program)
                 self.assertEqual(output, answer)
+
+class CompileTester(Tester):
+        def setUp(self):
+                super().setUp()
+                OPTS.append("--compile")
+
+        def tearDown(self):
+                OPTS.remove("--compile")
+                super().tearDown()
+
+class LispTester(Tester):
+        def setUp(self):
+                super().setUp()
+                OPTS.append("--lisp")
+
+        def tearDown(self):
+                OPTS.remove("--lisp")
+                super().tearDown()